@@ -0,0 +1,40 @@
+import pyopencl as cl
+
+from simulation         import Lattice, Geometry
+from symbolic.generator import LBM
+from utility.bandwidth  import BandwidthProbe, max_mlups
+
+import symbolic.D2Q9  as D2Q9
+import symbolic.D3Q19 as D3Q19
+import symbolic.D3Q27 as D3Q27
+
+configs = [
+    (D2Q9,  Geometry(1024, 1024),   (32,1)),
+    (D3Q19, Geometry(128, 128, 128), (32,1,1)),
+    (D3Q27, Geometry(128, 128, 128), (32,1,1))
+]
+
+precisions = [ 'single', 'double', 'half', 'bfloat16' ]
+
+print('Probing attainable bandwidth on %s\n' % cl.get_platforms()[0].get_devices()[0].name)
+
+for descriptor, geometry, layout in configs:
+    lbm = LBM(descriptor)
+
+    for precision in precisions:
+        lattice = Lattice(
+            descriptor = descriptor,
+            geometry   = geometry,
+            precision  = precision,
+            layout     = layout,
+            padding    = layout,
+            moments = lbm.moments(),
+            collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = 0.6))
+
+        bandwidth = BandwidthProbe(lattice).measure()
+
+        print('%s %s: copy %.1f GiB/s, triad %.1f GiB/s, stream %.1f GiB/s, %d bytes/update, max ~%d MLUPS' % (
+            descriptor.__name__, precision, bandwidth['copy'], bandwidth['triad'], bandwidth['stream'],
+            lattice.memory.bytes_per_update(), max_mlups(bandwidth['stream'], lattice.memory.bytes_per_update())))
+
+        del lattice
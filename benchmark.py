@@ -0,0 +1,66 @@
+import argparse
+import sys
+import time
+
+import pyopencl as cl
+
+from utility.benchmark import scenarios, precisions, collisions, run_scenario, load_results, store_results, collision_costs, compare
+
+parser = argparse.ArgumentParser(description = 'Run named LBM benchmark scenarios and compare them against a baseline.')
+parser.add_argument('--scenarios',  nargs = '+', default = sorted(scenarios.keys()), choices = sorted(scenarios.keys()))
+parser.add_argument('--precisions', nargs = '+', default = precisions, choices = precisions)
+parser.add_argument('--streaming',  default = 'AB', choices = [ 'AB', 'AA' ])
+parser.add_argument('--collisions', nargs = '+', default = [ 'bgk' ], choices = sorted(collisions.keys()))
+parser.add_argument('--samples',    type = int, default = 5)
+parser.add_argument('--steps',      type = int, default = 100)
+parser.add_argument('--platform',   type = int, default = 0)
+parser.add_argument('--bandwidth',  type = float, default = None, help = 'attainable bandwidth in GiB/s used as roofline, probed on the device by default')
+parser.add_argument('--output',     default = 'result/benchmark.json')
+parser.add_argument('--baseline',   default = None, help = 'JSON results or legacy result/*.log and result/*.py measurements')
+parser.add_argument('--threshold',  type = float, default = 0.05, help = 'relative MLUPS loss reported as regression')
+args = parser.parse_args()
+
+device = cl.get_platforms()[args.platform].get_devices()[0]
+
+results = {
+    'device':  device.name,
+    'time':    time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'results': []
+}
+
+for name in args.scenarios:
+    for descriptor in scenarios[name]['descriptors']:
+        for precision in args.precisions:
+            for collision in args.collisions:
+                record = run_scenario(name, descriptor, precision,
+                    samples   = args.samples,
+                    steps     = args.steps,
+                    streaming = args.streaming,
+                    collision = collision,
+                    bandwidth = args.bandwidth,
+                    platform  = args.platform)
+
+                print('%s %s %s %s: ~%d ± %d MLUPS, %.1f GiB/s, %.1f%% of roofline' % (
+                    name, descriptor.__name__, precision, collision, record['mlups'], record['stdev'], record['bandwidth'], record['roofline']))
+
+                results['results'].append(record)
+
+store_results(args.output, results)
+
+for record, base, cost in collision_costs(results):
+    print('%s %s %s %s: %.2fx the time per cell update of BGK' % (
+        record['scenario'], record['descriptor'], record['precision'], record['collision'], cost))
+
+if args.baseline != None:
+    baseline = load_results(args.baseline)
+    if baseline['device'] != results['device']:
+        print('Comparing against baseline measured on %s' % baseline['device'])
+
+    regressions = compare(results, baseline, args.threshold)
+
+    for record, base, change in regressions:
+        print('Regression in %s %s %s: %d MLUPS vs. %d MLUPS baseline (%.1f%%)' % (
+            record['scenario'], record['descriptor'], record['precision'], record['mlups'], base['mlups'], 100 * change))
+
+    if len(regressions) > 0:
+        sys.exit(1)
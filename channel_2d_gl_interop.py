@@ -193,14 +193,9 @@ particles = Particles(
     ].reshape(2,-1).T)
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
+    lattice.evolve(updates_per_frame, texture = moments_texture)
 
-    lattice.update_moments()
-    moments_texture.collect()
-
-    for i in range(0,updates_per_frame):
-        particles.update(aging = False)
+    particles.update(aging = False, steps = updates_per_frame)
 
     lattice.sync()
 
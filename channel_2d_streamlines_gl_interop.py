@@ -141,10 +141,7 @@ streamline_texture = Streamlines(
     list(map(lambda y: [2, y*lattice.geometry.size_y//48], range(1,48))))
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
-
-    lattice.update_moments()
+    lattice.evolve(updates_per_frame, moments = True)
     streamline_texture.update()
 
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
@@ -31,12 +31,12 @@ relaxation_time = 0.51
 
 def get_cavity_material_map(g):
     return [
-        (lambda x, y, z: x > 0 and x < g.size_x-1 and
-                         y > 0 and y < g.size_y-1 and
-                         z > 0 and z < g.size_z-1,            1), # bulk fluid
-        (lambda x, y, z: x == 1 or x == g.size_x-2 or
-                         y == 1 or y == g.size_y-2 or
-                         z == 1 or z == g.size_z-2,           2), # walls
+        (lambda x, y, z: (x > 0) & (x < g.size_x-1) &
+                         (y > 0) & (y < g.size_y-1) &
+                         (z > 0) & (z < g.size_z-1),          1), # bulk fluid
+        (lambda x, y, z: (x == 1) | (x == g.size_x-2) |
+                         (y == 1) | (y == g.size_y-2) |
+                         (z == 1) | (z == g.size_z-2),        2), # walls
         (lambda x, y, z: x == 1,                                     3), # inflow
         (lambda x, y, z: x == g.size_x-2,                     4), # outflow
 
@@ -47,9 +47,9 @@ def get_cavity_material_map(g):
         (Cylinder(g.size_x//3, 0, g.size_z//2, 5, l = g.size_y), 5),
         (Cylinder(g.size_x//3, g.size_y//2, 0, 5, h = g.size_z), 5),
 
-        (lambda x, y, z: x == 0 or x == g.size_x-1 or
-                         y == 0 or y == g.size_y-1 or
-                         z == 0 or z == g.size_z-1,           0)  # ghost cells
+        (lambda x, y, z: (x == 0) | (x == g.size_x-1) |
+                         (y == 0) | (y == g.size_y-1) |
+                         (z == 0) | (z == g.size_z-1),        0)  # ghost cells
     ]
 
 boundary = Template("""
@@ -207,7 +207,7 @@ lattice = Lattice(
 
 material_map = get_cavity_material_map(lattice.geometry)
 primitives   = list(map(lambda material: material[0], filter(lambda material: not callable(material[0]), material_map)))
-lattice.apply_material_map(material_map)
+lattice.apply_vectorized_material_map(material_map)
 lattice.sync_material()
 
 particles = Particles(
@@ -224,13 +224,9 @@ rotation = Rotation([-lattice_x/2, -lattice_y/2, -lattice_z/2])
 cube_vertices, cube_edges = lattice.geometry.wireframe()
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
+    lattice.evolve(updates_per_frame)
 
-    lattice.update_moments()
-
-    for i in range(0,updates_per_frame):
-        particles.update(aging = True)
+    particles.update(aging = True, steps = updates_per_frame)
 
     lattice.sync()
 
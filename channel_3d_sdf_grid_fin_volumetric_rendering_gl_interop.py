@@ -29,7 +29,8 @@ lattice_z = 100
 updates_per_frame = 5
 
 inflow = 0.1
-relaxation_time = 0.51
+relaxation_time = 0.501
+smagorinsky_constant = 0.1
 
 lbm = LBM(D3Q19)
 
@@ -306,7 +307,7 @@ lattice = Lattice(
     descriptor   = D3Q19,
     geometry     = Geometry(lattice_x, lattice_y, lattice_z),
     moments      = lbm.moments(optimize = True),
-    collide      = lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time, optimize = True),
+    collide      = lbm.bgk_smagorinsky(f_eq = lbm.equilibrium(), tau = relaxation_time, c_smago = smagorinsky_constant, optimize = True),
     boundary_src = boundary,
     opengl       = True
 )
@@ -321,10 +322,7 @@ rotation = Rotation([-0.5*lattice_x, -0.5*lattice_y, -0.5*lattice_z])
 cube_vertices, cube_edges = lattice.geometry.wireframe()
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
-
-    moments_texture.collect()
+    lattice.evolve(updates_per_frame, texture = moments_texture)
 
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
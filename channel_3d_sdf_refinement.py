@@ -0,0 +1,167 @@
+import time
+
+import matplotlib
+matplotlib.use('AGG')
+import matplotlib.pyplot as plt
+
+from mako.template import Template
+
+from simulation         import Lattice, Geometry
+from utility.refinement import RefinedLattice
+from utility.postprocessing import moments_view, velocity_norm
+from symbolic.generator import LBM
+
+import symbolic.D3Q19 as D3Q19
+
+# coarse lattice at half the resolution of the uniform channel
+lattice_x = 85
+lattice_y = 45
+lattice_z = 50
+
+# fine lattice around the grid fin in coarse cells
+refinement_origin = (4,  6,  2)
+refinement_extent = (28, 33, 46)
+
+inflow = 0.1
+relaxation_time = 0.505
+smagorinsky_constant = 0.1
+
+nUpdates = 20000
+nStat    = 1000
+
+def MLUPS(cells, steps, time):
+    return cells * steps / time * 1e-6
+
+def plot_velocity(refined, refinement):
+    coarse = velocity_norm(moments_view(refined.lattice,    refined.lattice.get_moments()))
+    fine   = velocity_norm(moments_view(refinement.lattice, refinement.lattice.get_moments()))
+
+    plt.figure(figsize=(20, 10))
+
+    plt.subplot(1, 2, 1)
+    plt.imshow(coarse[coarse.shape[0]//2,:,:], origin='lower', vmin=0.0, vmax=1.5*inflow, cmap=plt.get_cmap('seismic'))
+
+    plt.subplot(1, 2, 2)
+    plt.imshow(fine[fine.shape[0]//2,2:-2,2:-2], origin='lower', vmin=0.0, vmax=1.5*inflow, cmap=plt.get_cmap('seismic'))
+
+    plt.savefig("result/channel_3d_sdf_refinement.png", bbox_inches='tight', pad_inches=0)
+    plt.close()
+
+lbm = LBM(D3Q19)
+
+boundary = Template("""
+    if ( m == 2 ) {
+        u_0 = 0.0;
+        u_1 = 0.0;
+        u_2 = 0.0;
+    }
+    if ( m == 3 ) {
+        u_0 = min(time/5000.0 * ${inflow}, ${inflow});
+        u_1 = 0.0;
+        u_2 = 0.0;
+    }
+    if ( m == 4 ) {
+        rho = 1.0;
+    }
+""").render(
+    inflow = inflow
+)
+
+grid_fin = """
+float sdf(vec3 v) {
+    v = rotate_z(translate(v, v3(center.x/2, center.y, center.z)), -0.6);
+    const float width = 1;
+    const float angle = 0.64;
+
+    return add(
+        sadd(
+            sub(
+                rounded(box(v, v3(5, 28, 38)), 1),
+                rounded(box(v, v3(6, 26, 36)), 1)
+            ),
+            cylinder(translate(v, v3(0,0,-45)), 5, 12),
+            1
+        ),
+        sintersect(
+            box(v, v3(5, 28, 38)),
+            add(
+                add(
+                    box(rotate_x(v, angle), v3(10, width, 100)),
+                    box(rotate_x(v, -angle), v3(10, width, 100))
+                ),
+                add(
+                    add(
+                        add(
+                            box(rotate_x(translate(v, v3(0,0,25)), angle), v3(10, width, 100)),
+                            box(rotate_x(translate(v, v3(0,0,25)), -angle), v3(10, width, 100))
+                        ),
+                        add(
+                            box(rotate_x(translate(v, v3(0,0,-25)), angle), v3(10, width, 100)),
+                            box(rotate_x(translate(v, v3(0,0,-25)), -angle), v3(10, width, 100))
+                        )
+                    ),
+                    add(
+                        add(
+                            box(rotate_x(translate(v, v3(0,0,50)), angle), v3(10, width, 100)),
+                            box(rotate_x(translate(v, v3(0,0,50)), -angle), v3(10, width, 100))
+                        ),
+                        add(
+                            box(rotate_x(translate(v, v3(0,0,-50)), angle), v3(10, width, 100)),
+                            box(rotate_x(translate(v, v3(0,0,-50)), -angle), v3(10, width, 100))
+                        )
+                    )
+                )
+            ),
+            2
+        )
+    );
+}
+
+float sdf_bounding(vec3 v) {
+    v = rotate_z(translate(v, v3(center.x/2, center.y, center.z)), -0.6);
+    const float width = 1;
+    const float angle = 0.64;
+
+    return sadd(
+        rounded(box(v, v3(5, 28, 38)), 1),
+        cylinder(translate(v, v3(0,0,-45)), 5, 12),
+        1
+    );
+}
+"""
+
+def collide(tau):
+    return lbm.bgk_smagorinsky(f_eq = lbm.equilibrium(), tau = tau, c_smago = smagorinsky_constant, optimize = True)
+
+print("Initializing simulation...\n")
+
+lattice = Lattice(
+    descriptor   = D3Q19,
+    geometry     = Geometry(lattice_x, lattice_y, lattice_z),
+    moments      = lbm.moments(optimize = True),
+    collide      = collide(relaxation_time),
+    boundary_src = boundary
+)
+
+refined = RefinedLattice(lattice, relaxation_time)
+refinement = refined.refine(refinement_origin, refinement_extent, lbm, collide)
+
+# the obstacle is described in cells of the uniform channel, i.e. of the fine lattice
+refined.setup_channel_with_sdf_obstacle(grid_fin, scale = 2)
+
+uniform_cells = 8 * lattice.geometry.volume
+
+print("Refined lattice uses %d cells, %.1f%% of the %d cells of the uniform channel.\n" % (
+    refined.cells(), 100 * refined.cells() / uniform_cells, uniform_cells))
+
+lastStat = time.time()
+
+for i in range(nUpdates // nStat):
+    refined.evolve(nStat)
+    refined.sync()
+    print("i = %4d; %3.0f MLUPS" % (refined.time, MLUPS(refined.updates_per_step(), nStat, time.time() - lastStat)))
+    lastStat = time.time()
+
+print("\nConcluded simulation.\n")
+
+plot_velocity(refined, refinement)
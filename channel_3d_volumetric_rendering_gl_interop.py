@@ -309,10 +309,7 @@ rotation = Rotation([-0.5*lattice_x, -0.5*lattice_y, -0.5*lattice_z])
 cube_vertices, cube_edges = lattice.geometry.wireframe()
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
-
-    moments_texture.collect()
+    lattice.evolve(updates_per_frame, texture = moments_texture)
 
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
@@ -0,0 +1,65 @@
+import numpy
+import time
+
+from simulation         import Lattice, Geometry
+from symbolic.generator import LBM
+
+import symbolic.D3Q19 as D3Q19
+
+def MLUPS(cells, steps, time):
+    return cells * steps / time * 1e-6
+
+def unbound_evolve(lattice):
+    lattice.time += 1
+    if lattice.tick:
+        lattice.tick = False
+        lattice.program.collide_and_stream(
+            lattice.queue, lattice.grid.size(), lattice.layout, lattice.memory.cl_pop_a, lattice.memory.cl_pop_b, lattice.memory.cl_material, numpy.uint32(lattice.time))
+    else:
+        lattice.tick = True
+        lattice.program.collide_and_stream(
+            lattice.queue, lattice.grid.size(), lattice.layout, lattice.memory.cl_pop_b, lattice.memory.cl_pop_a, lattice.memory.cl_material, numpy.uint32(lattice.time))
+
+def measure(lattice, steps, evolve):
+    lattice.sync()
+    start = time.time()
+    evolve(steps)
+    enqueued = time.time()
+    lattice.sync()
+    end = time.time()
+    return (enqueued - start) / steps * 1e6, MLUPS(lattice.geometry.volume, steps, end - start)
+
+sizes = [ 16, 32, 64 ]
+
+nUpdates = 1000
+
+lbm = LBM(D3Q19)
+
+for size in sizes:
+    lattice = Lattice(
+        descriptor = D3Q19,
+        geometry   = Geometry(size, size, size),
+        layout     = (size,1,1),
+        padding    = (size,1,1),
+        moments    = lbm.moments(optimize = True),
+        collide    = lbm.bgk(f_eq = lbm.equilibrium(), tau = 0.52, optimize = True))
+    lattice.material[:] = 1
+    lattice.sync_material()
+
+    def unbound(steps):
+        for i in range(steps):
+            unbound_evolve(lattice)
+
+    def single(steps):
+        for i in range(steps):
+            lattice.evolve()
+
+    def batched(steps):
+        lattice.evolve(steps)
+
+    for name, evolve in [ ('unbound', unbound), ('single', single), ('batched', batched) ]:
+        evolve(10)
+        overhead, mlups = measure(lattice, nUpdates, evolve)
+        print('%3d, %-8s: %6.1f us host time per step, ~%d MLUPS' % (size, name, overhead, mlups))
+
+    del lattice
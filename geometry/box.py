@@ -12,6 +12,9 @@ class Box:
     def indicator(self):
         return lambda x, y, z: x >= self.x0 and x <= self.x1 and y >= self.y0 and y <= self.y1 and z >= self.z0 and z <= self.z1
 
+    def mask(self):
+        return lambda x, y, z: (x >= self.x0) & (x <= self.x1) & (y >= self.y0) & (y <= self.y1) & (z >= self.z0) & (z <= self.z1)
+
     def draw(self):
         glBegin(GL_POLYGON)
         glNormal(-1,0,0)
@@ -24,6 +24,12 @@ class Cylinder:
         else:
             return lambda x, y, z: (x - self.x)**2 + (y - self.y)**2 < self.r*self.r and z >= self.z and z <= self.z+self.h
 
+    def mask(self):
+        if self.h == 0:
+            return lambda x, y, z: ((x - self.x)**2 + (z - self.z)**2 < self.r*self.r) & (y >= self.y) & (y <= self.y+self.l)
+        else:
+            return lambda x, y, z: ((x - self.x)**2 + (y - self.y)**2 < self.r*self.r) & (z >= self.z) & (z <= self.z+self.h)
+
     def draw(self):
         glBegin(GL_TRIANGLE_FAN)
 
@@ -12,6 +12,9 @@ class Sphere:
     def indicator(self):
         return lambda x, y, z: (x - self.x)**2 + (y - self.y)**2 + (z - self.z)**2 < self.r*self.r
 
+    def mask(self):
+        return lambda x, y, z: (x - self.x)**2 + (y - self.y)**2 + (z - self.z)**2 < self.r*self.r
+
     def draw(self, resolution = 32):
         for i in range(0,resolution+1):
             lat0 = numpy.pi * (-0.5 + (i - 1) / resolution)
@@ -1,4 +1,3 @@
-import numpy
 import time
 
 import matplotlib
@@ -6,6 +5,8 @@ matplotlib.use('AGG')
 import matplotlib.pyplot as plt
 
 from simulation         import Lattice, Geometry
+from utility.timeseries import MomentsWriter, MomentsReader
+from utility.postprocessing import inner_moments_view, velocity_norm, render_frames
 from symbolic.generator import LBM
 
 import symbolic.D2Q9 as D2Q9
@@ -13,17 +14,18 @@ import symbolic.D2Q9 as D2Q9
 def MLUPS(cells, steps, time):
     return cells * steps / time * 1e-6
 
-def generate_moment_plots(lattice, moments):
-    for i, m in enumerate(moments):
-        print("Generating plot %d of %d." % (i+1, len(moments)))
+def plot_velocity(frame):
+    i, velocity = frame
+
+    plt.figure(figsize=(10, 10))
+    plt.imshow(velocity, origin='lower', cmap=plt.get_cmap('seismic'))
+    plt.savefig("result/implosion_%02d.png" % i, bbox_inches='tight', pad_inches=0)
+    plt.close()
 
-        velocity = numpy.ndarray(shape=tuple(reversed(lattice.geometry.inner_size())))
-        for x, y in lattice.geometry.inner_cells():
-            velocity[y-1,x-1] = numpy.sqrt(m[1,lattice.memory.gid(x,y)]**2 + m[2,lattice.memory.gid(x,y)]**2)
+    return i
 
-        plt.figure(figsize=(10, 10))
-        plt.imshow(velocity, origin='lower', cmap=plt.get_cmap('seismic'))
-        plt.savefig("result/implosion_%02d.png" % i, bbox_inches='tight', pad_inches=0)
+def generate_moment_plots(lattice, moments):
+    render_frames(plot_velocity, (velocity_norm(inner_moments_view(lattice, m)) for m in moments))
 
 def get_box_material_map(geometry):
     return [
@@ -36,13 +38,13 @@ pop_eq = """
     if ( sqrt(pow(get_global_id(0) - ${geometry.size_x//2}.f, 2.f)
             + pow(get_global_id(1) - ${geometry.size_y//2}.f, 2.f)) < ${geometry.size_x//10} ) {
 % for i, w_i in enumerate(descriptor.w):
-        preshifted_f_next[${i*geometry.volume}] = 1./24.f;
-        preshifted_f_prev[${i*geometry.volume}] = 1./24.f;
+        ${memory.storage.store('f_next', memory.layout.offset(i, 'gid'), '1./24.f')};
+        ${memory.storage.store('f_prev', memory.layout.offset(i, 'gid'), '1./24.f')};
 % endfor
     } else {
 % for i, w_i in enumerate(descriptor.w):
-        preshifted_f_next[${i*geometry.volume}] = ${w_i}.f;
-        preshifted_f_prev[${i*geometry.volume}] = ${w_i}.f;
+        ${memory.storage.store('f_next', memory.layout.offset(i, 'gid'), '%s.f' % w_i)};
+        ${memory.storage.store('f_prev', memory.layout.offset(i, 'gid'), '%s.f' % w_i)};
 % endfor
 }"""
 
@@ -56,8 +58,6 @@ boundary = """
 nUpdates = 2000
 nStat    = 100
 
-moments = []
-
 print("Initializing simulation...\n")
 
 lbm = LBM(D2Q9)
@@ -82,15 +82,14 @@ print("Starting simulation using %d cells...\n" % lattice.geometry.volume)
 
 lastStat = time.time()
 
-for i in range(1,nUpdates+1):
-    lattice.evolve()
-
-    if i % nStat == 0:
-        lattice.sync()
+with MomentsWriter("result/implosion_moments", (lattice.descriptor.d+1, lattice.memory.volume), lattice.memory.float_type) as writer:
+    for i, snapshot in lattice.snapshots(every = nStat, count = nUpdates // nStat):
         print("i = %4d; %3.0f MLUPS" % (i, MLUPS(lattice.geometry.volume, nStat, time.time() - lastStat)))
-        moments.append(lattice.get_moments())
+        writer.append(i, snapshot)
         lastStat = time.time()
 
 print("\nConcluded simulation.\n")
 
+moments = MomentsReader("result/implosion_moments")
+
 generate_moment_plots(lattice, moments)
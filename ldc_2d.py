@@ -1,4 +1,3 @@
-import numpy
 import time
 from string import Template
 
@@ -7,6 +6,8 @@ matplotlib.use('AGG')
 import matplotlib.pyplot as plt
 
 from simulation         import Lattice, Geometry
+from utility.postprocessing import inner_moments_view, velocity_norm, render_frames
+from utility.reduction import Reductions
 from symbolic.generator import LBM
 
 import symbolic.D2Q9 as D2Q9
@@ -17,17 +18,18 @@ relaxation_time = 0.52
 def MLUPS(cells, steps, time):
     return cells * steps / time * 1e-6
 
-def generate_moment_plots(lattice, moments):
-    for i, m in enumerate(moments):
-        print("Generating plot %d of %d." % (i+1, len(moments)))
+def plot_velocity(frame):
+    i, velocity = frame
+
+    plt.figure(figsize=(10, 10))
+    plt.imshow(velocity, origin='lower', cmap=plt.get_cmap('seismic'))
+    plt.savefig("result/ldc_2d_%02d.png" % i, bbox_inches='tight', pad_inches=0)
+    plt.close()
 
-        velocity = numpy.ndarray(shape=tuple(reversed(lattice.geometry.inner_size())))
-        for x, y in lattice.geometry.inner_cells():
-            velocity[y-1,x-1] = numpy.sqrt(m[1,lattice.memory.gid(x,y)]**2 + m[2,lattice.memory.gid(x,y)]**2)
+    return i
 
-        plt.figure(figsize=(10, 10))
-        plt.imshow(velocity, origin='lower', cmap=plt.get_cmap('seismic'))
-        plt.savefig("result/ldc_2d_%02d.png" % i, bbox_inches='tight', pad_inches=0)
+def generate_moment_plots(lattice, moments):
+    render_frames(plot_velocity, (velocity_norm(inner_moments_view(lattice, m)) for m in moments))
 
 def get_cavity_material_map(geometry):
     return [
@@ -50,8 +52,9 @@ boundary = Template("""
     'lid_speed': lid_speed
 })
 
-nUpdates = 100000
-nStat    = 5000
+nUpdates  = 100000
+nStat     = 5000
+tolerance = 1e-4
 
 moments = []
 
@@ -76,18 +79,26 @@ lattice.apply_material_map(
     get_cavity_material_map(lattice.geometry))
 lattice.sync_material()
 
+diagnostics = Reductions(lattice)
+lattice.schedule(nStat, diagnostics.enqueue)
+
+def print_statistics(lattice):
+    global lastStat
+    lattice.sync()
+    stat = diagnostics.latest()
+    print("i = %4d; %3.0f MLUPS; mass %.6f; max |u| %.4f" % (
+        lattice.time, MLUPS(lattice.geometry.volume, nStat, time.time() - lastStat), stat['mass'] / stat['cells'], stat['max_velocity']))
+    moments.append(lattice.get_moments())
+    lastStat = time.time()
+
+lattice.schedule(nStat, print_statistics)
+
 print("Starting simulation using %d cells...\n" % lattice.geometry.volume)
 
 lastStat = time.time()
 
-for i in range(1,nUpdates+1):
-    lattice.evolve()
-
-    if i % nStat == 0:
-        lattice.sync()
-        print("i = %4d; %3.0f MLUPS" % (i, MLUPS(lattice.geometry.volume, nStat, time.time() - lastStat)))
-        moments.append(lattice.get_moments())
-        lastStat = time.time()
+if lattice.run_until_converged(tolerance, check_every = nStat, max_steps = nUpdates):
+    print("\nConverged after %d steps with residual %.2e." % (lattice.time, lattice.residual.last['L2']))
 
 print("\nConcluded simulation.\n")
 
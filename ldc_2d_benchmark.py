@@ -2,7 +2,7 @@ import numpy
 import time
 from string import Template
 
-from simulation         import Lattice, Geometry
+from simulation         import Lattice, Geometry, SoA, AoS, AoSoA
 from symbolic.generator import LBM
 
 import symbolic.D2Q9 as D2Q9
@@ -39,7 +39,11 @@ boundary = Template("""
 base_2_sizes  = {32, 64, 128, 256, 512, 1024, 2048}
 base_10_sizes = {50, 100, 200, 400, 600, 800, 1000}
 
-precisions = {'single', 'double'}
+precisions = {'single', 'double', 'half', 'bfloat16'}
+
+streamings = {'AB', 'AA'}
+
+population_layouts = {SoA, AoS, AoSoA}
 
 base_2_layouts = {
     (  16, 1),
@@ -61,24 +65,24 @@ base_10_layouts = {
 
 base_2_configs = list(filter(
     lambda config: config[0] % config[1][0] == 0,
-    itertools.product(*[base_2_sizes, base_2_layouts, precisions, {True, False}, {True}])
+    itertools.product(*[base_2_sizes, base_2_layouts, precisions, {True, False}, {True}, streamings, population_layouts])
 ))
 
 align_configs = list(filter(
     lambda config: config[0] % config[1][0] == 0,
-    itertools.product(*[base_10_sizes, base_10_layouts, precisions, {True, False}, {True, False}])
+    itertools.product(*[base_10_sizes, base_10_layouts, precisions, {True, False}, {True, False}, streamings, population_layouts])
 ))
 
 pad_configs = list(filter(
     lambda config: config[0] - config[1][0] >= -100,
-    itertools.product(*[base_10_sizes, base_2_layouts, precisions, {True, False}, {True}])
+    itertools.product(*[base_10_sizes, base_2_layouts, precisions, {True, False}, {True}, streamings, population_layouts])
 ))
 
 lbm = LBM(D2Q9)
 
 measurements = []
 
-for size, layout, precision, opti, align in base_2_configs + align_configs + pad_configs:
+for size, layout, precision, opti, align, streaming, population_layout in base_2_configs + align_configs + pad_configs:
     lattice = Lattice(
         descriptor = D2Q9,
         geometry   = Geometry(size, size),
@@ -86,6 +90,8 @@ for size, layout, precision, opti, align in base_2_configs + align_configs + pad
         layout  = layout,
         padding = layout,
         align   = align,
+        streaming = streaming,
+        population_layout = population_layout,
         moments = lbm.moments(optimize = opti),
         collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time, optimize = opti),
         boundary_src = boundary)
@@ -109,8 +115,10 @@ for size, layout, precision, opti, align in base_2_configs + align_configs + pad
             stats.append(mlups)
             lastStat = time.time()
 
-    print('%s: ~%d MLUPS' % ((size, layout, precision, opti, align), numpy.average(stats)))
-    measurements.append(((size, layout, precision, opti, align), stats))
+    config = (size, layout, precision, opti, align, streaming, lattice.memory.layout.name)
+    roofline = lattice.roofline()
+    print('%s: ~%d MLUPS (%.1f%% of ~%d MLUPS roofline), %d bytes/cell' % (config, numpy.average(stats), 100 * numpy.average(stats) / roofline, roofline, lattice.memory.bytes_per_cell()))
+    measurements.append((config, stats, lattice.memory.bytes_per_cell(), roofline))
     del lattice
 
 with open('result/ldc_2d_benchmark.data', 'w') as f:
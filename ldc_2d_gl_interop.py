@@ -139,10 +139,7 @@ moments_texture = MomentsTexture(lattice)
 cube_vertices, cube_edges = lattice.geometry.wireframe()
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
-
-    moments_texture.collect()
+    lattice.evolve(updates_per_frame, texture = moments_texture)
 
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
@@ -0,0 +1,78 @@
+import numpy
+import time
+from string import Template
+
+from simulation         import Lattice, Geometry
+from utility.postprocessing import inner_moments_view, velocity
+from symbolic.generator import LBM
+
+import symbolic.D2Q9 as D2Q9
+
+lid_speed = 0.1
+relaxation_time = 0.52
+
+def MLUPS(cells, steps, time):
+    return cells * steps / time * 1e-6
+
+def get_cavity_material_map(geometry):
+    return [
+        (lambda x, y: x > 0 and x < geometry.size_x-1 and y > 0 and y < geometry.size_y-1,  1), # bulk fluid
+        (lambda x, y: x == 1 or y == 1 or x == geometry.size_x-2,                           2), # left, right, bottom walls
+        (lambda x, y: y == geometry.size_y-2,                                               3), # lid
+        (lambda x, y: x == 0 or x == geometry.size_x-1 or y == 0 or y == geometry.size_y-1, 0)  # ghost cells
+    ]
+
+boundary = Template("""
+    if ( m == 2 ) {
+        u_0 = 0.0;
+        u_1 = 0.0;
+    }
+    if ( m == 3 ) {
+        u_0 = $lid_speed;
+        u_1 = 0.0;
+    }
+""").substitute({
+    'lid_speed': lid_speed
+})
+
+size      = 256
+nUpdates  = 5000
+
+precisions = ['single', 'double', 'half', 'bfloat16']
+
+lbm = LBM(D2Q9)
+
+velocities   = {}
+measurements = []
+
+for precision in precisions:
+    lattice = Lattice(
+        descriptor = D2Q9,
+        geometry   = Geometry(size, size),
+        precision  = precision,
+        layout     = (32,1),
+        moments = lbm.moments(optimize = False),
+        collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time),
+        boundary_src = boundary)
+    lattice.apply_material_map(
+        get_cavity_material_map(lattice.geometry))
+    lattice.sync_material()
+
+    start = time.time()
+    lattice.run(nUpdates)
+    lattice.sync()
+    mlups = MLUPS(lattice.geometry.volume, nUpdates, time.time() - start)
+
+    velocities[precision] = velocity(inner_moments_view(lattice, lattice.get_moments())).astype(numpy.float64)
+
+    drift = velocities[precision] - velocities['single']
+    max_drift = numpy.max(numpy.abs(drift))
+    l2_drift  = numpy.linalg.norm(drift) / numpy.linalg.norm(velocities['single'])
+
+    config = (size, precision)
+    print('%s: ~%d MLUPS, %d bytes/cell, max drift %.2e, relative L2 drift %.2e' % (config, mlups, lattice.memory.bytes_per_cell(), max_drift, l2_drift))
+    measurements.append((config, mlups, lattice.memory.bytes_per_cell(), max_drift, l2_drift))
+    del lattice
+
+with open('result/ldc_2d_precision_benchmark.data', 'w') as f:
+    f.write(str(measurements))
@@ -1,4 +1,3 @@
-import numpy
 import time
 
 import matplotlib
@@ -6,6 +5,9 @@ matplotlib.use('AGG')
 import matplotlib.pyplot as plt
 
 from simulation         import Lattice, Geometry
+from utility.timeseries import MomentsWriter, MomentsReader
+from utility.reduction  import Residual
+from utility.postprocessing import inner_moments_view, velocity_norm, render_frames
 from symbolic.generator import LBM
 
 import symbolic.D3Q19 as D3Q19
@@ -25,46 +27,37 @@ def export_vtk(lattice, moments):
             'velocity_z': m[3,:].reshape(lattice.geometry.size(), order = 'F')
         })
 
-def generate_moment_plots(lattice, moments):
-    for i, m in enumerate(moments):
-        print("Generating plot %d of %d." % (i+1, len(moments)))
+def plot_velocity(frame):
+    i, velocity = frame
 
-        velocity = numpy.ndarray(shape=tuple(reversed(lattice.geometry.inner_size())))
+    plt.figure(figsize=(20, 10))
 
-        # extract x-z-plane
-        y_slice = lattice.geometry.size_y//2
-        for z, x in numpy.ndindex(lattice.geometry.size_z-2, lattice.geometry.size_x-2):
-            gid = lattice.memory.gid(x+1,y_slice,z+1)
-            velocity[z,y_slice,x] = numpy.sqrt(m[1,gid]**2 + m[2,gid]**2 + m[3,gid]**2)
+    # plot x-z-plane
+    plt.subplot(1, 2, 1)
+    plt.imshow(velocity[:,velocity.shape[1]//2,:], origin='lower', vmin=0.0, vmax=0.15, cmap=plt.get_cmap('seismic'))
 
-        # extract y-z-plane
-        x_slice = lattice.geometry.size_x//2
-        for z, y in numpy.ndindex(lattice.geometry.size_z-2, lattice.geometry.size_y-2):
-            gid = lattice.memory.gid(x_slice,y+1,z+1)
-            velocity[z,y,x_slice] = numpy.sqrt(m[1,gid]**2 + m[2,gid]**2 + m[3,gid]**2)
+    # plot y-z-plane
+    plt.subplot(1, 2, 2)
+    plt.imshow(velocity[:,:,velocity.shape[2]//2], origin='lower', vmin=0.0, vmax=0.15, cmap=plt.get_cmap('seismic'))
 
-        plt.figure(figsize=(20, 10))
+    plt.savefig("result/ldc_3d_%02d.png" % i, bbox_inches='tight', pad_inches=0)
+    plt.close()
 
-        # plot x-z-plane
-        plt.subplot(1, 2, 1)
-        plt.imshow(velocity[:,y_slice,:], origin='lower', vmin=0.0, vmax=0.15, cmap=plt.get_cmap('seismic'))
+    return i
 
-        # plot y-z-plane
-        plt.subplot(1, 2, 2)
-        plt.imshow(velocity[:,:,x_slice], origin='lower', vmin=0.0, vmax=0.15, cmap=plt.get_cmap('seismic'))
-
-        plt.savefig("result/ldc_3d_%02d.png" % i, bbox_inches='tight', pad_inches=0)
+def generate_moment_plots(lattice, moments):
+    render_frames(plot_velocity, (velocity_norm(inner_moments_view(lattice, m)) for m in moments))
 
 def get_cavity_material_map(geometry):
     return [
-        (lambda x, y, z: x > 0 and x < geometry.size_x-1 and
-                         y > 0 and y < geometry.size_y-1 and
-                         z > 0 and z < geometry.size_z-1,                                                1), # bulk fluid
-        (lambda x, y, z: x == 1 or y == 1 or z == 1 or x == geometry.size_x-2 or y == geometry.size_y-2, 2), # walls
-        (lambda x, y, z: z == geometry.size_z-2,                                                         3), # lid
-        (lambda x, y, z: x == 0 or x == geometry.size_x-1 or
-                         y == 0 or y == geometry.size_y-1 or
-                         z == 0 or z == geometry.size_z-1,                                               0)  # ghost cells
+        (lambda x, y, z: (x > 0) & (x < geometry.size_x-1) &
+                         (y > 0) & (y < geometry.size_y-1) &
+                         (z > 0) & (z < geometry.size_z-1),                                                      1), # bulk fluid
+        (lambda x, y, z: (x == 1) | (y == 1) | (z == 1) | (x == geometry.size_x-2) | (y == geometry.size_y-2), 2), # walls
+        (lambda x, y, z: z == geometry.size_z-2,                                                                 3), # lid
+        (lambda x, y, z: (x == 0) | (x == geometry.size_x-1) |
+                         (y == 0) | (y == geometry.size_y-1) |
+                         (z == 0) | (z == geometry.size_z-1),                                                    0)  # ghost cells
     ]
 
 boundary = """
@@ -80,10 +73,9 @@ boundary = """
     }
 """
 
-nUpdates = 10000
-nStat    = 1000
-
-moments = []
+nUpdates  = 50000
+nStat     = 1000
+tolerance = 1e-4
 
 print("Initializing simulation...\n")
 
@@ -98,24 +90,31 @@ lattice = Lattice(
 
     boundary_src = boundary)
 
-lattice.apply_material_map(
+lattice.apply_vectorized_material_map(
     get_cavity_material_map(lattice.geometry))
 lattice.sync_material()
 
+residual = Residual(lattice)
+lattice.schedule(nStat, residual.enqueue)
+
 print("Starting simulation using %d cells...\n" % lattice.geometry.volume)
 
 lastStat = time.time()
 
-for i in range(1,nUpdates+1):
-    lattice.evolve()
-
-    if i % nStat == 0:
-        lattice.sync()
-        print("i = %4d; %3.0f MLUPS" % (i, MLUPS(lattice.geometry.volume, nStat, time.time() - lastStat)))
-        moments.append(lattice.get_moments())
+with MomentsWriter("result/ldc_3d_moments", (lattice.descriptor.d+1, lattice.memory.volume), lattice.memory.float_type) as writer:
+    for i, snapshot in lattice.snapshots(every = nStat, count = nUpdates // nStat):
+        # the newest check may still be in flight behind the pipelined snapshot
+        converged = residual.converged(tolerance, keep = 1)
+        print("i = %4d; %3.0f MLUPS; residual %.2e" % (i, MLUPS(lattice.geometry.volume, nStat, time.time() - lastStat), residual.last['L2']))
+        writer.append(i, snapshot)
         lastStat = time.time()
+        if converged:
+            print("\nConverged after %d steps." % i)
+            break
 
 print("\nConcluded simulation.\n")
 
+moments = MomentsReader("result/ldc_3d_moments")
+
 #export_vtk(lattice, moments)
 generate_moment_plots(lattice, moments)
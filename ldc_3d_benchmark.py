@@ -2,7 +2,7 @@ import numpy
 import time
 from string import Template
 
-from simulation         import Lattice, Geometry
+from simulation         import Lattice, Geometry, SoA, AoS, AoSoA
 from symbolic.generator import LBM
 
 import symbolic.D3Q19 as D3Q19
@@ -64,26 +64,30 @@ base_10_layouts = {
 
 descriptors = { D3Q19, D3Q27 }
 
-precisions = { 'single', 'double' }
+precisions = { 'single', 'double', 'half', 'bfloat16' }
+
+streamings = { 'AB', 'AA' }
+
+population_layouts = { SoA, AoS, AoSoA }
 
 base_2_configs = list(filter(
     lambda config: config[0] % config[1][0] == 0,
-    itertools.product(*[base_2_sizes, base_2_layouts, descriptors, precisions, {True, False}, {True}])
+    itertools.product(*[base_2_sizes, base_2_layouts, descriptors, precisions, {True, False}, {True}, streamings, population_layouts])
 ))
 
 align_configs = list(filter(
     lambda config: config[0] % config[1][0] == 0,
-    itertools.product(*[base_10_sizes, base_10_layouts, descriptors, precisions, {True, False}, {True, False}])
+    itertools.product(*[base_10_sizes, base_10_layouts, descriptors, precisions, {True, False}, {True, False}, streamings, population_layouts])
 ))
 
 pad_configs = list(filter(
     lambda config: config[0] - config[1][0] >= -28,
-    itertools.product(*[base_10_sizes, base_2_layouts, descriptors, precisions, {True, False}, {True}])
+    itertools.product(*[base_10_sizes, base_2_layouts, descriptors, precisions, {True, False}, {True}, streamings, population_layouts])
 ))
 
 measurements = []
 
-for size, layout, descriptor, precision, opti, align in base_2_configs + align_configs + pad_configs:
+for size, layout, descriptor, precision, opti, align, streaming, population_layout in base_2_configs + align_configs + pad_configs:
     lbm = LBM(descriptor)
     lattice = Lattice(
         descriptor = descriptor,
@@ -92,6 +96,8 @@ for size, layout, descriptor, precision, opti, align in base_2_configs + align_c
         layout  = layout,
         padding = layout,
         align   = align,
+        streaming = streaming,
+        population_layout = population_layout,
         moments = lbm.moments(optimize = opti),
         collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time, optimize = opti),
         boundary_src = boundary)
@@ -115,8 +121,10 @@ for size, layout, descriptor, precision, opti, align in base_2_configs + align_c
             stats.append(mlups)
             lastStat = time.time()
 
-    print('%s: ~%d MLUPS' % ((size, layout, descriptor.__name__, precision, opti, align), numpy.average(stats)))
-    measurements.append(((size, layout, descriptor.__name__, precision, opti, align), stats))
+    config = (size, layout, descriptor.__name__, precision, opti, align, streaming, lattice.memory.layout.name)
+    roofline = lattice.roofline()
+    print('%s: ~%d MLUPS (%.1f%% of ~%d MLUPS roofline), %d bytes/cell' % (config, numpy.average(stats), 100 * numpy.average(stats) / roofline, roofline, lattice.memory.bytes_per_cell()))
+    measurements.append((config, stats, lattice.memory.bytes_per_cell(), roofline))
     del lattice, lbm
 
 with open('result/ldc_3d_benchmark.data', 'w') as f:
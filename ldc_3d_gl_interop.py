@@ -156,13 +156,9 @@ rotation = Rotation([-lattice_x/2, -lattice_y/2, -lattice_z/2])
 cube_vertices, cube_edges = lattice.geometry.wireframe()
 
 def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
+    lattice.evolve(updates_per_frame)
 
-    lattice.update_moments()
-
-    for i in range(0,updates_per_frame):
-        particles.update(aging = True)
+    particles.update(aging = True, steps = updates_per_frame)
 
     lattice.sync()
 
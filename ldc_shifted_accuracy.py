@@ -0,0 +1,116 @@
+import numpy
+from string import Template
+
+from simulation         import Lattice, Geometry
+from utility.postprocessing import inner_moments_view, velocity
+from symbolic.generator import LBM
+
+import symbolic.D2Q9  as D2Q9
+import symbolic.D3Q19 as D3Q19
+
+relaxation_time = 0.52
+
+def get_2d_cavity_material_map(geometry):
+    return [
+        (lambda x, y: (x > 0) & (x < geometry.size_x-1) & (y > 0) & (y < geometry.size_y-1),  1), # bulk fluid
+        (lambda x, y: (x == 1) | (y == 1) | (x == geometry.size_x-2),                           2), # left, right, bottom walls
+        (lambda x, y: y == geometry.size_y-2,                                                   3), # lid
+        (lambda x, y: (x == 0) | (x == geometry.size_x-1) | (y == 0) | (y == geometry.size_y-1), 0)  # ghost cells
+    ]
+
+def get_3d_cavity_material_map(geometry):
+    return [
+        (lambda x, y, z: (x > 0) & (x < geometry.size_x-1) &
+                         (y > 0) & (y < geometry.size_y-1) &
+                         (z > 0) & (z < geometry.size_z-1),                                                      1), # bulk fluid
+        (lambda x, y, z: (x == 1) | (y == 1) | (z == 1) | (x == geometry.size_x-2) | (y == geometry.size_y-2), 2), # walls
+        (lambda x, y, z: z == geometry.size_z-2,                                                                 3), # lid
+        (lambda x, y, z: (x == 0) | (x == geometry.size_x-1) |
+                         (y == 0) | (y == geometry.size_y-1) |
+                         (z == 0) | (z == geometry.size_z-1),                                                    0)  # ghost cells
+    ]
+
+boundary = {
+    2: Template("""
+    if ( m == 2 ) {
+        u_0 = 0.0;
+        u_1 = 0.0;
+    }
+    if ( m == 3 ) {
+        u_0 = $lid_speed;
+        u_1 = 0.0;
+    }
+"""),
+    3: Template("""
+    if ( m == 2 ) {
+        u_0 = 0.0;
+        u_1 = 0.0;
+        u_2 = 0.0;
+    }
+    if ( m == 3 ) {
+        u_0 = $lid_speed;
+        u_1 = 0.0;
+        u_2 = 0.0;
+    }
+""")
+}
+
+cases = [
+    (D2Q9,  Geometry(128, 128),    (32,1),   get_2d_cavity_material_map, 20000),
+    (D3Q19, Geometry(32, 32, 32), (32,1,1), get_3d_cavity_material_map,  4000),
+]
+
+lid_speeds = [ 0.1, 0.01, 0.001 ]
+
+# reference is the unshifted double precision formulation
+configs = [
+    ('double',   False),
+    ('single',   False),
+    ('single',   True),
+    ('half',     True),
+    ('bfloat16', True),
+]
+
+def simulate(descriptor, geometry, layout, material_map, steps, lid_speed, precision, shifted):
+    lbm = LBM(descriptor, shifted = shifted)
+
+    lattice = Lattice(
+        descriptor = descriptor,
+        geometry   = geometry,
+        precision  = precision,
+        shifted    = shifted,
+        layout     = layout,
+        moments = lbm.moments(optimize = False),
+        collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time),
+        boundary_src = boundary[descriptor.d].substitute({
+            'lid_speed': lid_speed
+        }))
+    lattice.apply_vectorized_material_map(
+        material_map(lattice.geometry))
+    lattice.sync_material()
+
+    lattice.run(steps)
+    lattice.sync()
+
+    return velocity(inner_moments_view(lattice, lattice.get_moments())).astype(numpy.float64)
+
+measurements = []
+
+for descriptor, geometry, layout, material_map, steps in cases:
+    for lid_speed in lid_speeds:
+        reference = None
+
+        for precision, shifted in configs:
+            u = simulate(descriptor, geometry, layout, material_map, steps, lid_speed, precision, shifted)
+            if reference is None:
+                reference = u
+
+            max_error = numpy.max(numpy.abs(u - reference)) / lid_speed
+            l2_error  = numpy.linalg.norm(u - reference) / numpy.linalg.norm(reference)
+
+            config = (descriptor.__name__, lid_speed, precision, shifted)
+            print('%s: max error %.2e, relative L2 error %.2e' % (config, max_error, l2_error))
+            measurements.append((config, max_error, l2_error))
+
+with open('result/ldc_shifted_accuracy.data', 'w') as f:
+    f.write(str(measurements))
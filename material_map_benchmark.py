@@ -0,0 +1,89 @@
+import numpy
+import time
+
+from simulation         import Lattice, Geometry
+from symbolic.generator import LBM
+
+import symbolic.D3Q19 as D3Q19
+
+from geometry.sphere   import Sphere
+from geometry.box      import Box
+from geometry.cylinder import Cylinder
+
+def get_obstacles(g):
+    return [
+        (Box(g.size_x//10, 1.5*g.size_x//10, 0,             2*g.size_y//5, 0, g.size_z), 5),
+        (Box(g.size_x//10, 1.5*g.size_x//10, 3*g.size_y//5, g.size_y,      0, g.size_z), 5),
+
+        (Sphere(g.size_x//3, g.size_y//2, g.size_z//2, g.size_z//4), 5),
+        (Cylinder(g.size_x//3, 0, g.size_z//2, 5, l = g.size_y), 5),
+        (Cylinder(g.size_x//3, g.size_y//2, 0, 5, h = g.size_z), 5),
+    ]
+
+def get_channel_material_map(g):
+    return [
+        (lambda x, y, z: x > 0 and x < g.size_x-1 and
+                         y > 0 and y < g.size_y-1 and
+                         z > 0 and z < g.size_z-1,            1), # bulk fluid
+        (lambda x, y, z: x == 1 or x == g.size_x-2 or
+                         y == 1 or y == g.size_y-2 or
+                         z == 1 or z == g.size_z-2,           2), # walls
+        (lambda x, y, z: x == 1,                              3), # inflow
+        (lambda x, y, z: x == g.size_x-2,                     4), # outflow
+    ] + get_obstacles(g) + [
+        (lambda x, y, z: x == 0 or x == g.size_x-1 or
+                         y == 0 or y == g.size_y-1 or
+                         z == 0 or z == g.size_z-1,           0)  # ghost cells
+    ]
+
+def get_vectorized_channel_material_map(g):
+    return [
+        (lambda x, y, z: (x > 0) & (x < g.size_x-1) &
+                         (y > 0) & (y < g.size_y-1) &
+                         (z > 0) & (z < g.size_z-1),          1), # bulk fluid
+        (lambda x, y, z: (x == 1) | (x == g.size_x-2) |
+                         (y == 1) | (y == g.size_y-2) |
+                         (z == 1) | (z == g.size_z-2),        2), # walls
+        (lambda x, y, z: x == 1,                              3), # inflow
+        (lambda x, y, z: x == g.size_x-2,                     4), # outflow
+    ] + get_obstacles(g) + [
+        (lambda x, y, z: (x == 0) | (x == g.size_x-1) |
+                         (y == 0) | (y == g.size_y-1) |
+                         (z == 0) | (z == g.size_z-1),        0)  # ghost cells
+    ]
+
+sizes = [
+    ( 34, 18, 20),
+    ( 68, 36, 40),
+    (170, 90, 100),
+]
+
+lbm = LBM(D3Q19)
+
+moments = lbm.moments(optimize = False)
+collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = 0.51, optimize = False)
+
+for size in sizes:
+    lattice = Lattice(
+        descriptor = D3Q19,
+        geometry   = Geometry(*size),
+        moments    = moments,
+        collide    = collide)
+
+    lattice.material[:] = 0
+    start = time.time()
+    lattice.apply_material_map(
+        get_channel_material_map(lattice.geometry))
+    interpreted = time.time() - start
+    reference = lattice.material.copy()
+
+    lattice.material[:] = 0
+    start = time.time()
+    lattice.apply_vectorized_material_map(
+        get_vectorized_channel_material_map(lattice.geometry))
+    vectorized = time.time() - start
+
+    assert numpy.array_equal(reference, lattice.material)
+
+    print('%s: interpreted %8.3f s, vectorized %6.3f s, speedup ~%d' % (size, interpreted, vectorized, interpreted / vectorized))
+    del lattice
@@ -0,0 +1,68 @@
+import numpy
+import time
+
+from simulation         import Lattice, Geometry
+from symbolic.generator import LBM
+from utility.particles  import Particles
+from utility.benchmark  import scenarios, boundary, relaxation_time
+
+import symbolic.D2Q9 as D2Q9
+
+def MPUPS(particles, steps, time):
+    return particles * steps / time * 1e-6
+
+def measure(particles, frames, steps, sort_every = None):
+    particles.lattice.sync()
+    start = time.time()
+    for frame in range(frames):
+        if sort_every != None and frame % sort_every == 0:
+            particles.sort()
+        particles.update(aging = True, steps = steps)
+    particles.lattice.sync()
+    return MPUPS(particles.count, frames * steps, time.time() - start)
+
+counts = [ 10000, 30000, 100000, 300000, 1000000 ]
+
+nFrames    = 20
+nSteps     = 40
+nSortEvery = 5
+
+scenario = scenarios['channel_2d']
+
+lbm = LBM(D2Q9)
+
+lattice = Lattice(
+    descriptor = D2Q9,
+    geometry   = Geometry(*scenario['size']),
+    layout     = scenario['layout'],
+    padding    = scenario['layout'],
+    moments    = lbm.moments(),
+    collide    = lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time),
+    boundary_src = boundary[2].substitute({
+        'speed': scenario['speed']
+    }))
+
+lattice.material[:] = 0
+lattice.apply_vectorized_material_map(
+    scenario['material_map'](lattice.geometry))
+lattice.sync_material()
+
+# develop the flow so that particles are advected along a non-trivial velocity field
+lattice.evolve(2000)
+
+for count in counts:
+    # randomly placed particles reproduce the scattered access pattern of a long running simulation
+    grid = 1 + numpy.random.sample((count, 2)) * (numpy.array(lattice.geometry.size()) - 2)
+
+    unsorted = Particles(lattice, grid)
+    measure(unsorted, 1, nSteps)
+    unsorted_mpups = measure(unsorted, nFrames, nSteps)
+
+    ordered = Particles(lattice, grid)
+    measure(ordered, 1, nSteps, 1)
+    sorted_mpups = measure(ordered, nFrames, nSteps, nSortEvery)
+
+    print('%7d particles: unsorted ~%.1f, sorted every %d frames ~%.1f million particle updates per second (%.2fx)' % (
+        count, unsorted_mpups, nSortEvery, sorted_mpups, sorted_mpups / unsorted_mpups))
+
+    del unsorted, ordered
@@ -0,0 +1,66 @@
+import numpy
+import time
+import tempfile
+
+import matplotlib
+matplotlib.use('AGG')
+import matplotlib.pyplot as plt
+
+from pathlib import Path
+
+from simulation         import Lattice, Geometry
+from symbolic.generator import LBM
+
+from utility.postprocessing import inner_moments_view, velocity_norm, render_frames
+
+import symbolic.D2Q9 as D2Q9
+
+nFrames = 8
+
+output = Path(tempfile.mkdtemp())
+
+def plot_velocity(frame):
+    i, velocity = frame
+
+    plt.figure(figsize=(10, 10))
+    plt.imshow(velocity, origin='lower', cmap=plt.get_cmap('seismic'))
+    plt.savefig(output/("implosion_%02d.png" % i), bbox_inches='tight', pad_inches=0)
+    plt.close()
+
+    return i
+
+def generate_moment_plots_serially(lattice, moments):
+    for i, m in enumerate(moments):
+        velocity = numpy.ndarray(shape=tuple(reversed(lattice.geometry.inner_size())))
+        for x, y in lattice.geometry.inner_cells():
+            velocity[y-1,x-1] = numpy.sqrt(m[1,lattice.memory.gid(x,y)]**2 + m[2,lattice.memory.gid(x,y)]**2)
+
+        plot_velocity((i, velocity))
+
+def generate_moment_plots(lattice, moments):
+    render_frames(plot_velocity, (velocity_norm(inner_moments_view(lattice, m)) for m in moments))
+
+lbm = LBM(D2Q9)
+
+lattice = Lattice(
+    descriptor = D2Q9,
+    geometry   = Geometry(1024, 1024),
+
+    layout = (32,1),
+
+    moments = lbm.moments(optimize = False),
+    collide = lbm.bgk(f_eq = lbm.equilibrium(), tau = 0.8))
+
+moments = [
+    numpy.random.sample((lattice.descriptor.d+1, lattice.memory.volume)).astype(lattice.memory.float_type) for i in range(nFrames)
+]
+
+start = time.time()
+generate_moment_plots_serially(lattice, moments)
+serial = time.time() - start
+
+start = time.time()
+generate_moment_plots(lattice, moments)
+parallel = time.time() - start
+
+print('serial: %.1f s, vectorized and parallel: %.1f s, speedup ~%.1f' % (serial, parallel, serial / parallel))
@@ -10,9 +10,19 @@ from mako.template import Template
 from mako.lookup import TemplateLookup
 
 from pathlib import Path
+from collections import deque
+from itertools import product
 
 from pyopencl.tools import get_gl_sharing_context_properties
 
+from utility.cache import program_cache as default_program_cache
+from utility.checkpoint import CheckpointWriter, read_checkpoint
+from utility.autotune   import autotuner
+from utility.bandwidth  import BandwidthProbe, max_mlups
+from utility.profiling  import Profiler
+from utility.reduction  import Residual
+from symbolic.cache import descriptor_key
+
 class Geometry:
     def __init__(self, size_x, size_y, size_z = 1):
         self.size_x = size_x
@@ -89,17 +99,99 @@ class Grid:
         else:
             return (self.size_x, self.size_y, self.size_z)
 
+class Storage:
+    def __init__(self, dtype, type):
+        self.dtype = dtype
+        self.type  = type
+
+    def load(self, pointer, offset):
+        return '%s[%s]' % (pointer, offset)
+
+    def store(self, pointer, offset, value):
+        return '%s[%s] = %s' % (pointer, offset, value)
+
+class HalfStorage:
+    def __init__(self):
+        self.dtype = numpy.float16
+        self.type  = 'half'
+
+    def load(self, pointer, offset):
+        return 'vload_half(%s, %s)' % (offset, pointer)
+
+    def store(self, pointer, offset, value):
+        return 'vstore_half_rte(%s, %s, %s)' % (value, offset, pointer)
+
+class BFloat16Storage:
+    def __init__(self):
+        self.dtype = numpy.uint16
+        self.type  = 'ushort'
+
+    def load(self, pointer, offset):
+        return 'as_float(((uint)%s[%s]) << 16)' % (pointer, offset)
+
+    def store(self, pointer, offset, value):
+        # round to nearest even
+        return '%s[%s] = (ushort)((as_uint((float)(%s)) + 0x7fff + ((as_uint((float)(%s)) >> 16) & 1)) >> 16)' % (pointer, offset, value, value)
+
+class SoA:
+    def __init__(self, q, volume):
+        self.name   = 'SoA'
+        self.q      = q
+        self.volume = volume
+
+    def shape(self):
+        return (self.q, self.volume)
+
+    def offset(self, i, cell):
+        return '%d + %s' % (i * self.volume, cell)
+
+class AoS:
+    def __init__(self, q, volume):
+        self.name   = 'AoS'
+        self.q      = q
+        self.volume = volume
+
+    def shape(self):
+        return (self.volume, self.q)
+
+    def offset(self, i, cell):
+        return '(%s)*%d + %d' % (cell, self.q, i)
+
+class AoSoA:
+    def __init__(self, q, volume, block = 16):
+        self.name   = 'AoSoA%d' % block
+        self.q      = q
+        self.volume = volume
+        self.block  = block
+
+    def shape(self):
+        return (pad(self.volume, self.block) // self.block, self.q, self.block)
+
+    def offset(self, i, cell):
+        return '(%s)/%d*%d + (%s)%%%d + %d' % (cell, self.block, self.block * self.q, cell, self.block, i * self.block)
+
 class Memory:
-    def __init__(self, descriptor, grid, context, float_type, align, opengl):
+    def __init__(self, descriptor, grid, context, float_type, align, opengl, streaming = 'AB', storage = None, population_layout = None):
         self.descriptor = descriptor
         self.context    = context
         self.float_type = float_type
+        self.streaming  = streaming
+
+        if storage == None:
+            self.storage = Storage(float_type, {
+                numpy.float32: 'float',
+                numpy.float64: 'double'
+            }.get(float_type, None))
+        else:
+            self.storage = storage
 
         if align:
             self.size_x = pad(grid.size_x, {
+                numpy.float16: 64,
+                numpy.uint16:  64,
                 numpy.float32: 32,
                 numpy.float64: 16
-            }.get(float_type, None))
+            }.get(self.storage.dtype, None))
         else:
             self.size_x = grid.size_x
 
@@ -108,15 +200,33 @@ class Memory:
 
         self.volume = self.size_x * self.size_y * self.size_z
 
-        self.pop_size     = descriptor.q     * self.volume * self.float_type(0).nbytes
+        if population_layout == None:
+            self.layout = SoA(descriptor.q, self.volume)
+        else:
+            self.layout = population_layout(descriptor.q, self.volume)
+
+        self.moments_layout = SoA(descriptor.d+1, self.volume)
+
+        self.pop_size     = int(numpy.prod(self.layout.shape())) * self.storage.dtype(0).nbytes
         self.moments_size = (descriptor.d+1) * self.volume * self.float_type(0).nbytes
 
         self.cl_pop_a = cl.Buffer(self.context, mf.READ_WRITE, size=self.pop_size)
-        self.cl_pop_b = cl.Buffer(self.context, mf.READ_WRITE, size=self.pop_size)
+        if self.streaming == 'AB':
+            self.cl_pop_b = cl.Buffer(self.context, mf.READ_WRITE, size=self.pop_size)
+        else:
+            self.cl_pop_b = None
 
         self.cl_moments  = cl.Buffer(self.context, mf.WRITE_ONLY, size=self.moments_size)
         self.cl_material = cl.Buffer(self.context, mf.READ_WRITE, size=self.volume * numpy.int32(0).nbytes)
 
+    def bytes_per_cell(self):
+        pop_buffers = {'AB': 2, 'AA': 1}.get(self.streaming)
+        return (pop_buffers * self.pop_size + self.moments_size) / self.volume + numpy.int32(0).nbytes
+
+    def bytes_per_update(self):
+        # every cell update reads and writes all populations and reads its material
+        return 2 * self.descriptor.q * self.storage.dtype(0).nbytes + numpy.int32(0).nbytes
+
     def gid(self, x, y, z = 0):
         return z * (self.size_x*self.size_y) + y * self.size_x + x;
 
@@ -129,21 +239,166 @@ class Memory:
     def cells(self):
         return ndindex(self.size(), order='F')
 
+    def coordinates(self):
+        return numpy.ogrid[tuple(slice(0, n) for n in self.size())]
+
+class SparseMemory(Memory):
+    def __init__(self, descriptor, grid, context, float_type, block, storage, population_layout = None):
+        self.descriptor = descriptor
+        self.context    = context
+        self.float_type = float_type
+        self.streaming  = 'AB'
+        self.population_layout = population_layout
+
+        if storage == None:
+            self.storage = Storage(float_type, {
+                numpy.float32: 'float',
+                numpy.float64: 'double'
+            }.get(float_type, None))
+        else:
+            self.storage = storage
+
+        self.size_x = grid.size_x
+        self.size_y = grid.size_y
+        self.size_z = grid.size_z
+
+        self.volume = self.size_x * self.size_y * self.size_z
+
+        self.block        = tuple(block)
+        self.block_volume = int(numpy.prod(self.block))
+        self.blocks = 0
+        self.active = None
+
+        # moments and material remain dense to serve as the on demand view of the lattice
+        self.moments_layout = SoA(descriptor.d+1, self.volume)
+        self.moments_size   = (descriptor.d+1) * self.volume * self.float_type(0).nbytes
+
+        self.cl_moments  = cl.Buffer(self.context, mf.WRITE_ONLY, size=self.moments_size)
+        self.cl_material = cl.Buffer(self.context, mf.READ_WRITE, size=self.volume * numpy.int32(0).nbytes)
+
+    def bytes_per_cell(self):
+        return (2 * self.pop_size + self.moments_size) / self.volume + numpy.int32(0).nbytes
+
+    def allocate(self, material):
+        d = self.descriptor.d
+
+        cells  = material.reshape(self.size(), order='F')
+        blocks = cells.reshape(sum([ (b, n // b) for b, n in zip(self.block, self.size()) ], ()), order='F')
+        blocks = blocks.transpose(tuple(range(1, 2*d, 2)) + tuple(range(0, 2*d, 2)))
+
+        active  = (blocks != 0).any(axis = tuple(range(d, 2*d)))
+        changed = self.active is None or not numpy.array_equal(active, self.active)
+
+        # cells are stored block by block with the x axis varying fastest inside of each block
+        self.block_material = numpy.ascontiguousarray(
+            blocks[active].transpose((0,) + tuple(reversed(range(1, d+1))))).reshape(-1)
+
+        if not changed:
+            return False
+
+        self.active = active
+        self.blocks = int(active.sum())
+
+        if self.blocks == 0:
+            raise ValueError('sparse lattice contains no cells with non-zero material')
+
+        index = numpy.full(tuple(n + 2 for n in active.shape), -1, dtype=numpy.int32)
+        index[(slice(1, -1),) * d][active] = numpy.arange(self.blocks, dtype=numpy.int32)
+
+        self.block_origin = numpy.ascontiguousarray(numpy.argwhere(active), dtype=numpy.uint32)
+
+        # neighbor block of each direction in {-1,0,1}^d with the x offset varying fastest
+        self.block_neighbors = numpy.stack([
+            index[tuple(self.block_origin[:,k].astype(numpy.int64) + 1 + offset[k] for k in range(d))]
+            for offset in [ tuple(reversed(o)) for o in product((-1,0,1), repeat=d) ]
+        ], axis = 1).astype(numpy.int32, order = 'C')
+
+        self.sparse_volume = self.blocks * self.block_volume
+
+        if self.population_layout == None:
+            self.layout = SoA(self.descriptor.q, self.sparse_volume)
+        else:
+            self.layout = self.population_layout(self.descriptor.q, self.sparse_volume)
+
+        self.pop_size = int(numpy.prod(self.layout.shape())) * self.storage.dtype(0).nbytes
+
+        self.cl_pop_a = cl.Buffer(self.context, mf.READ_WRITE, size=self.pop_size)
+        self.cl_pop_b = cl.Buffer(self.context, mf.READ_WRITE, size=self.pop_size)
+
+        self.cl_block_material  = cl.Buffer(self.context, mf.READ_WRITE, size=self.block_material.nbytes)
+        self.cl_block_origin    = cl.Buffer(self.context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=self.block_origin)
+        self.cl_block_neighbors = cl.Buffer(self.context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=self.block_neighbors)
+
+        return True
+
 class Lattice:
     def __init__(self,
         descriptor, geometry, moments, collide,
         pop_eq_src = '', boundary_src = '',
-        platform = 0, precision = 'single', layout = None, padding = None, align = False, opengl = False
+        platform = 0, precision = 'single', layout = None, padding = None, align = False, opengl = False,
+        streaming = 'AB', shifted = False, population_layout = None, program_cache = None, compiler_args = None,
+        profile = False, queue = None, block = None
     ):
+        for exprs in [ moments, collide ]:
+            if getattr(exprs, 'shifted', shifted) != shifted:
+                raise ValueError('moments and collision must be generated with shifted = %s' % shifted)
+
+        if layout == 'auto':
+            tuned = autotuner.get(
+                cl.get_platforms()[platform].get_devices()[0],
+                (
+                    descriptor_key(descriptor),
+                    geometry.size(),
+                    precision,
+                    streaming,
+                    shifted,
+                    SoA(descriptor.q, 0).name if population_layout == None else population_layout(descriptor.q, 0).name,
+                    moments,
+                    collide,
+                    boundary_src
+                ),
+                lambda **config: Lattice(
+                    descriptor, geometry, moments, collide, pop_eq_src, boundary_src, platform, precision,
+                    streaming = streaming, shifted = shifted, population_layout = population_layout, program_cache = program_cache,
+                    **config),
+                descriptor.d,
+                precision)
+
+            layout        = tuned['layout']
+            padding       = tuned['padding']
+            align         = tuned['align']
+            compiler_args = tuned['compiler_args']
+
+        if block != None:
+            if streaming != 'AB':
+                raise ValueError('sparse lattices require AB streaming')
+            if pop_eq_src != '':
+                raise ValueError('sparse lattices do not support custom equilibrium sources')
+            # each work group updates one block of cells
+            padding = block
+            layout  = (int(numpy.prod(block)),)
+
         self.descriptor = descriptor
         self.geometry   = geometry
         self.grid       = Grid(self.geometry, padding)
+        self.block      = block
+        self.opengl     = opengl
 
         self.time = 0
 
+        self.precision = precision
+        self.shifted   = shifted
+
         self.float_type = {
-            'single': (numpy.float32, 'float'),
-            'double': (numpy.float64, 'double'),
+            'single':   (numpy.float32, 'float'),
+            'double':   (numpy.float64, 'double'),
+            'half':     (numpy.float32, 'float'),
+            'bfloat16': (numpy.float32, 'float'),
+        }.get(precision, None)
+
+        self.storage = {
+            'half':     HalfStorage(),
+            'bfloat16': BFloat16Storage(),
         }.get(precision, None)
 
         self.mako_lookup = TemplateLookup(directories = [
@@ -152,7 +407,9 @@ class Lattice:
 
         self.platform = cl.get_platforms()[platform]
 
-        if opengl:
+        if queue != None:
+            self.context = queue.context
+        elif opengl:
             try:
                 self.context = cl.Context(
                     properties = [
@@ -168,10 +425,30 @@ class Lattice:
             self.context = cl.Context(
                 properties=[(cl.context_properties.PLATFORM, self.platform)])
 
-        self.queue = cl.CommandQueue(self.context)
+        self.stats = Profiler(profile)
+        if queue != None:
+            self.queue = queue
+        else:
+            self.queue = cl.CommandQueue(self.context, properties = self.stats.queue_properties())
+
+        if program_cache == None:
+            self.program_cache = default_program_cache
+        else:
+            self.program_cache = program_cache
+
+        if block != None:
+            self.memory = SparseMemory(self.descriptor, self.grid, self.context, self.float_type[0], block, self.storage, population_layout)
+        else:
+            self.memory = Memory(self.descriptor, self.grid, self.context, self.float_type[0], align, opengl, streaming, self.storage, population_layout)
 
-        self.memory = Memory(self.descriptor, self.grid, self.context, self.float_type[0], align, opengl)
+        self.update_bytes  = self.memory.bytes_per_update() * self.grid.volume
+        self.collect_bytes = (self.descriptor.q * self.memory.storage.dtype(0).nbytes + (self.descriptor.d+1) * self.memory.float_type(0).nbytes) * self.grid.volume
+        self.moments_bytes = (self.descriptor.d+1) * self.memory.float_type(0).nbytes * self.grid.volume
         self.tick = False
+        self.checkpoint_writer = None
+        self.bandwidth = None
+        self.scheduled = []
+        self.residual  = None
 
         self.moments = moments
         self.collide = collide
@@ -181,17 +458,36 @@ class Lattice:
 
         self.layout = layout
 
-        self.compiler_args = {
-            'single': '-cl-single-precision-constant -cl-fast-relaxed-math',
-            'double': '-cl-fast-relaxed-math'
-        }.get(precision, None)
+        if compiler_args == None:
+            self.compiler_args = {
+                'single':   '-cl-single-precision-constant -cl-fast-relaxed-math',
+                'double':   '-cl-fast-relaxed-math',
+                'half':     '-cl-single-precision-constant -cl-fast-relaxed-math',
+                'bfloat16': '-cl-single-precision-constant -cl-fast-relaxed-math'
+            }.get(precision, None)
+        else:
+            self.compiler_args = compiler_args
 
-        self.build_kernel()
+        self.material = numpy.ndarray(shape=(self.memory.volume, 1), dtype=numpy.int32)
 
-        self.program.equilibrilize(
-            self.queue, self.grid.size(), self.layout, self.memory.cl_pop_a, self.memory.cl_pop_b).wait()
+        # sparse lattices allocate their blocks once the material is synchronized
+        if self.block == None:
+            self.build_kernel()
+            self.equilibrilize()
 
-        self.material = numpy.ndarray(shape=(self.memory.volume, 1), dtype=numpy.int32)
+    def equilibrilize(self):
+        if self.memory.streaming == 'AB':
+            self.stats.record('equilibrilize', self.program.equilibrilize(
+                self.queue, self.work_size(), self.layout, self.memory.cl_pop_a, self.memory.cl_pop_b), 2 * self.memory.pop_size).wait()
+        else:
+            self.stats.record('equilibrilize', self.program.equilibrilize(
+                self.queue, self.work_size(), self.layout, self.memory.cl_pop_a, self.memory.cl_pop_a), self.memory.pop_size).wait()
+
+    def work_size(self):
+        if self.block != None:
+            return (self.memory.sparse_volume,)
+        else:
+            return self.grid.size()
 
     def apply_material_map(self, material_map):
         for primitive, material in material_map:
@@ -201,24 +497,56 @@ class Lattice:
                 indicator = primitive.indicator()
                 self.material[[indicator(*idx) for idx in self.memory.cells()]] = material
 
-    def setup_channel_with_sdf_obstacle(self, sdf_src):
+    def apply_vectorized_material_map(self, material_map):
+        coordinates = self.memory.coordinates()
+        cells = self.material.reshape(self.memory.size(), order='F')
+        for primitive, material in material_map:
+            if callable(primitive):
+                mask = primitive(*coordinates)
+            else:
+                mask = primitive.mask()(*coordinates)
+            cells[numpy.broadcast_to(mask, cells.shape)] = material
+
+    def setup_channel_with_sdf_obstacle(self, sdf_src, scale = 1):
         sdf_kernel_src = Template(
             filename = 'template/sdf.cl.mako',
             lookup   = self.mako_lookup
         ).render(
             geometry = self.memory,
-            sdf_src  = sdf_src
+            sdf_src  = sdf_src,
+            scale    = scale
         )
 
-        sdf_program = cl.Program(self.context, sdf_kernel_src).build(self.compiler_args)
+        sdf_program = self.program_cache.build(self.context, sdf_kernel_src, self.compiler_args)
         sdf_program.setup_channel_with_sdf_obstacle(self.queue, self.memory.size(), None, self.memory.cl_material)
         cl.enqueue_copy(self.queue, self.material, self.memory.cl_material).wait()
 
+        if self.block != None:
+            self.sync_material()
+
     def sync_material(self):
-        cl.enqueue_copy(self.queue, self.memory.cl_material, self.material).wait()
+        self.stats.record('copy_material', cl.enqueue_copy(
+            self.queue, self.memory.cl_material, self.material), self.material.nbytes).wait()
+
+        if self.block != None:
+            # changing the set of blocks that contain non-ghost cells resets all populations
+            if self.memory.allocate(self.material):
+                self.update_bytes  = self.memory.bytes_per_update() * self.memory.sparse_volume
+                self.collect_bytes = (self.descriptor.q * self.memory.storage.dtype(0).nbytes + (self.descriptor.d+1) * self.memory.float_type(0).nbytes) * self.memory.sparse_volume
+                self.time = 0
+                self.tick = False
+                self.build_kernel()
+                self.equilibrilize()
+            self.stats.record('copy_material', cl.enqueue_copy(
+                self.queue, self.memory.cl_block_material, self.memory.block_material), self.memory.block_material.nbytes).wait()
 
     def build_kernel(self):
-        program_src = Template(filename = str(Path(__file__).parent/'template/kernel.mako')).render(
+        if self.block != None:
+            template = Path(__file__).parent/'template/sparse.mako'
+        else:
+            template = Path(__file__).parent/'template/kernel.mako'
+
+        program_src = Template(filename = str(template)).render(
             descriptor = self.descriptor,
             geometry   = self.geometry,
             memory     = self.memory,
@@ -229,6 +557,8 @@ class Lattice:
             collide_assignment = self.collide[1],
 
             float_type = self.float_type[1],
+            shifted    = self.shifted,
+            opengl     = self.opengl,
 
             pop_eq_src = Template(self.pop_eq_src).render(
                 descriptor = self.descriptor,
@@ -245,32 +575,265 @@ class Lattice:
 
             ccode = sympy.ccode
         )
-        self.program = cl.Program(self.context, program_src).build(self.compiler_args)
-
-    def evolve(self):
-        self.time += 1
-        if self.tick:
-            self.tick = False
-            self.program.collide_and_stream(
-                self.queue, self.grid.size(), self.layout, self.memory.cl_pop_a, self.memory.cl_pop_b, self.memory.cl_material, numpy.uint32(self.time))
+
+        self.program = self.program_cache.build(self.context, program_src, self.compiler_args)
+
+        self.bind_kernels()
+
+    def bind_kernels(self):
+        if self.block != None:
+            names = [ 'collide_and_stream', 'collide_and_stream' ]
+            self.kernel_args = [
+                (self.memory.cl_pop_b, self.memory.cl_pop_a, self.memory.cl_block_material, self.memory.cl_block_neighbors),
+                (self.memory.cl_pop_a, self.memory.cl_pop_b, self.memory.cl_block_material, self.memory.cl_block_neighbors)
+            ]
+        elif self.memory.streaming == 'AA':
+            names = [ 'collide_and_stream_even', 'collide_and_stream_odd' ]
+            self.kernel_args = [
+                (self.memory.cl_pop_a, self.memory.cl_material),
+                (self.memory.cl_pop_a, self.memory.cl_material)
+            ]
         else:
-            self.tick = True
-            self.program.collide_and_stream(
-                self.queue, self.grid.size(), self.layout, self.memory.cl_pop_b, self.memory.cl_pop_a, self.memory.cl_material, numpy.uint32(self.time))
+            names = [ 'collide_and_stream', 'collide_and_stream' ]
+            self.kernel_args = [
+                (self.memory.cl_pop_b, self.memory.cl_pop_a, self.memory.cl_material),
+                (self.memory.cl_pop_a, self.memory.cl_pop_b, self.memory.cl_material)
+            ]
+
+        self.collide_and_stream = self.bind_kernel_variant(names, '')
+        self.time_arg = len(self.kernel_args[0])
+
+        # fused variants additionally write the moments of every updated cell
+        if self.block == None:
+            self.collide_and_stream_moments = self.bind_kernel_variant(names, '_moments', self.memory.cl_moments)
+            if self.opengl:
+                self.collide_and_stream_gl_moments = self.bind_kernel_variant(names, '_gl_moments')
+
+    def bind_kernel_variant(self, names, suffix, *output):
+        kernels = [ cl.Kernel(self.program, name + suffix) for name in names ]
+        for kernel, args in zip(kernels, self.kernel_args):
+            for i, arg in enumerate(args + (numpy.uint32(self.time),) + output):
+                kernel.set_arg(i, arg)
+        return kernels
+
+    def evolve(self, n = 1, moments = False, texture = None):
+        # whether the last update writes the moments, sparse lattices gather their blocks in a separate pass
+        fused = self.block == None and n > 0
+
+        for i in range(n):
+            self.time += 1
+            name   = 'collide_and_stream'
+            kernel = self.collide_and_stream[self.tick]
+            nbytes = self.update_bytes
+            # the last update writes the requested moments instead of a separate collection pass
+            if i == n - 1 and fused:
+                if moments:
+                    name   = 'collide_and_stream_moments'
+                    kernel = self.collide_and_stream_moments[self.tick]
+                    nbytes = self.update_bytes + self.moments_bytes
+                elif texture != None:
+                    cl.enqueue_acquire_gl_objects(self.queue, [texture.cl_gl_moments])
+                    name   = 'collide_and_stream_gl_moments'
+                    kernel = self.collide_and_stream_gl_moments[self.tick]
+                    kernel.set_arg(self.time_arg + 1, texture.cl_gl_moments)
+                    kernel.set_arg(self.time_arg + 2, numpy.int32(texture.include_materials))
+                    nbytes = self.update_bytes + 4 * self.memory.float_type(0).nbytes * self.grid.volume
+            kernel.set_arg(self.time_arg, numpy.uint32(self.time))
+            self.stats.record(name, cl.enqueue_nd_range_kernel(
+                self.queue, kernel, self.work_size(), self.layout), nbytes)
+            self.tick = not self.tick
+            for every, callback in self.scheduled:
+                if self.time % every == 0:
+                    callback(self)
+
+        # outputs that were not written by a fused update are collected separately
+        if moments and not fused:
+            self.update_moments()
+        if texture != None and (moments or not fused):
+            texture.collect()
+
+    def schedule(self, every, callback):
+        self.scheduled.append((every, callback))
+
+    def run(self, steps):
+        self.evolve(steps)
+
+    def run_until_converged(self, tol, check_every = 1000, max_steps = None, norm = 'L2'):
+        if self.residual == None:
+            self.residual = Residual(self)
+        self.residual.reset()
+
+        start = self.time
+        while max_steps == None or self.time - start < max_steps:
+            if max_steps == None:
+                self.evolve(check_every)
+            else:
+                self.evolve(min(check_every, max_steps - (self.time - start)))
+            self.residual.enqueue()
+            self.queue.flush()
+            # judge the previous check so that the latest steps stay queued on the device
+            if self.residual.converged(tol, norm, keep = 1):
+                return True
+
+        return self.residual.converged(tol, norm)
 
     def sync(self):
         self.queue.finish()
 
-    def update_moments(self):
-        if self.tick:
-            self.program.collect_moments(
-                self.queue, self.grid.size(), self.layout, self.memory.cl_pop_b, self.memory.cl_moments)
+    def population(self):
+        if self.tick and self.memory.streaming == 'AB':
+            return self.memory.cl_pop_b
         else:
-            self.program.collect_moments(
-                self.queue, self.grid.size(), self.layout, self.memory.cl_pop_a, self.memory.cl_moments)
+            return self.memory.cl_pop_a
+
+    def swapped(self):
+        return self.tick and self.memory.streaming == 'AA'
+
+    def update_moments(self, moments = None):
+        if moments is None:
+            moments = self.memory.cl_moments
+
+        if self.block != None:
+            # cells outside of allocated blocks read as zero in the dense view
+            cl.enqueue_fill_buffer(self.queue, moments, self.float_type[0](0), 0, self.memory.moments_size)
+            return self.stats.record('collect_moments', self.program.collect_moments(
+                self.queue, self.work_size(), self.layout, self.population(), self.memory.cl_block_origin, moments), self.collect_bytes)
+        elif self.swapped():
+            return self.stats.record('collect_moments', self.program.collect_moments_swapped(
+                self.queue, self.grid.size(), self.layout, self.population(), moments), self.collect_bytes)
+        else:
+            return self.stats.record('collect_moments', self.program.collect_moments(
+                self.queue, self.grid.size(), self.layout, self.population(), moments), self.collect_bytes)
 
     def get_moments(self):
         moments = numpy.ndarray(shape=(self.descriptor.d+1, self.memory.volume), dtype=self.float_type[0])
         self.update_moments()
-        cl.enqueue_copy(self.queue, moments, self.memory.cl_moments).wait();
+        self.stats.record('copy_moments', cl.enqueue_copy(
+            self.queue, moments, self.memory.cl_moments), moments.nbytes).wait()
         return moments
+
+    def snapshots(self, every, count = None, depth = 2):
+        # yielded arrays are slots of a ring of mapped host buffers that is reused once the
+        # generator resumes, consumers keeping a snapshot beyond that must copy it
+        copy_queue = cl.CommandQueue(self.context, properties = self.stats.queue_properties())
+
+        slots = []
+        for i in range(depth):
+            device = cl.Buffer(self.context, mf.READ_WRITE, size=self.memory.moments_size)
+            pinned = cl.Buffer(self.context, mf.READ_WRITE | mf.ALLOC_HOST_PTR, size=self.memory.moments_size)
+            host, _ = cl.enqueue_map_buffer(
+                copy_queue, pinned, cl.map_flags.READ | cl.map_flags.WRITE, 0,
+                (self.descriptor.d+1, self.memory.volume), self.float_type[0])
+            slots.append((device, pinned, host))
+
+        pending = deque()
+        n = 0
+
+        try:
+            while count == None or n < count:
+                self.evolve(every)
+
+                device, _, host = slots[n % depth]
+                collected = self.update_moments(device)
+                self.queue.flush()
+
+                pending.append((self.time, host, self.stats.record('copy_moments', cl.enqueue_copy(
+                    copy_queue, host, device, wait_for = [collected], is_blocking = False), host.nbytes)))
+                copy_queue.flush()
+                n += 1
+
+                if len(pending) == depth:
+                    time, host, copied = pending.popleft()
+                    copied.wait()
+                    yield time, host
+
+            while len(pending) > 0:
+                time, host, copied = pending.popleft()
+                copied.wait()
+                yield time, host
+        finally:
+            copy_queue.finish()
+            for device, pinned, host in slots:
+                host.base.release(copy_queue)
+            copy_queue.finish()
+
+    def attainable_bandwidth(self):
+        if self.bandwidth == None:
+            self.bandwidth = BandwidthProbe(self).measure()['stream']
+        return self.bandwidth
+
+    def roofline(self):
+        return max_mlups(self.attainable_bandwidth(), self.memory.bytes_per_update())
+
+    def layout_metadata(self):
+        return {
+            'descriptor': {
+                'd': self.descriptor.d,
+                'q': self.descriptor.q,
+                'c': [ list(map(int, c_i)) for c_i in self.descriptor.c ]
+            },
+            'geometry':  list(self.geometry.size()),
+            'memory':    list(self.memory.size()),
+            'precision': self.precision,
+            'shifted':   self.shifted,
+            'streaming': self.memory.streaming,
+            'population_layout': self.memory.layout.name
+        }
+
+    def checkpoint(self, path):
+        if self.block != None:
+            raise ValueError('checkpoints of sparse lattices are not supported')
+
+        self.sync_checkpoint()
+
+        populations = numpy.ndarray(shape=self.memory.layout.shape(), dtype=self.memory.storage.dtype)
+        material    = numpy.ndarray(shape=(self.memory.volume, 1), dtype=numpy.int32)
+
+        events = [
+            self.stats.record('copy_populations', cl.enqueue_copy(
+                self.queue, populations, self.population(), is_blocking = False), populations.nbytes),
+            self.stats.record('copy_material', cl.enqueue_copy(
+                self.queue, material, self.memory.cl_material, is_blocking = False), material.nbytes)
+        ]
+        self.queue.flush()
+
+        header = self.layout_metadata()
+        header['time'] = self.time
+        header['tick'] = bool(self.tick)
+
+        self.checkpoint_writer = CheckpointWriter(path, header, {
+            'populations': populations,
+            'material':    material
+        }, events)
+        self.checkpoint_writer.start()
+
+    def sync_checkpoint(self):
+        if self.checkpoint_writer != None:
+            writer = self.checkpoint_writer
+            writer.join()
+            self.checkpoint_writer = None
+            if writer.error != None:
+                raise writer.error
+
+    def restore(self, path):
+        if self.block != None:
+            raise ValueError('checkpoints of sparse lattices are not supported')
+
+        self.sync_checkpoint()
+
+        header, arrays = read_checkpoint(path)
+
+        layout = self.layout_metadata()
+        for key, value in layout.items():
+            if header[key] != value:
+                raise ValueError('checkpoint %s does not match lattice' % key)
+
+        self.time = header['time']
+        self.tick = header['tick']
+
+        self.material[:] = arrays['material']
+        self.stats.record('copy_populations', cl.enqueue_copy(
+            self.queue, self.population(), arrays['populations']), arrays['populations'].nbytes)
+        self.stats.record('copy_material', cl.enqueue_copy(
+            self.queue, self.memory.cl_material, arrays['material']), arrays['material'].nbytes)
+        self.queue.finish()
@@ -0,0 +1,122 @@
+import sympy
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+
+from pathlib import Path
+
+from utility.cache import default_cache_path
+
+# bump to invalidate all cached expressions
+VERSION = 2
+
+def fingerprint():
+    digest = hashlib.sha256()
+    digest.update(str(VERSION).encode())
+    digest.update(sympy.__version__.encode())
+    for name in [ 'cache.py', 'characteristics.py', 'generator.py', 'optimizations.py' ]:
+        digest.update((Path(__file__).parent/name).read_bytes())
+    return digest.hexdigest()[:16]
+
+class KeyedList(list):
+    pass
+
+class KeyedTuple(tuple):
+    pass
+
+def tag(value, key):
+    if isinstance(value, tuple):
+        value = KeyedTuple(value)
+    elif isinstance(value, list):
+        value = KeyedList(value)
+    else:
+        return value
+    value.key = key
+    return value
+
+def descriptor_key(descriptor):
+    return (
+        descriptor.d,
+        descriptor.q,
+        tuple(map(lambda c_i: tuple(c_i), descriptor.c)),
+        tuple(map(str, getattr(descriptor, 'w', [])))
+    )
+
+class CodegenCache:
+    def __init__(self, path = None):
+        self.root = Path(path or default_cache_path())/'codegen'
+        self.path = self.root/fingerprint()
+
+        self.hits   = 0
+        self.misses = 0
+
+    def key(self, *parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            if hasattr(part, 'key'):
+                digest.update(part.key.encode())
+            else:
+                digest.update(str(part).encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key, generate):
+        path = self.path/('%s.pickle' % key)
+
+        if path.exists():
+            try:
+                # keep unevaluated subexpressions such as expanded squares intact
+                with open(path, 'rb') as f, sympy.evaluate(False):
+                    value = pickle.load(f)
+                self.hits += 1
+                return value
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                pass
+
+        self.misses += 1
+        value = tag(generate(), key)
+
+        try:
+            self.path.mkdir(parents = True, exist_ok = True)
+            tmp = path.with_suffix('.tmp%d' % os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+        return value
+
+    def stats(self):
+        return {
+            'hits':    self.hits,
+            'misses':  self.misses,
+            'version': self.path.name
+        }
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors = True)
+
+codegen_cache = CodegenCache()
+
+def memoize(method):
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def memoized(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        key = codegen_cache.key(method.__name__, descriptor_key(self.descriptor), 'shifted=%s' % self.shifted, *[
+            '%s=%s' % (name, codegen_cache.key(value)) for name, value in arguments.arguments.items() if name != 'self'
+        ])
+        value = codegen_cache.get(key, lambda: method(self, *args, **kwargs))
+        # lattices check that they store populations in the same formulation
+        if isinstance(value, (KeyedList, KeyedTuple)):
+            value.shifted = self.shifted
+        return value
+
+    return memoized
@@ -1,4 +1,5 @@
 from sympy import *
+from itertools import product
 
 # copy of `sympy.integrals.quadrature.gauss_hermite` sans evaluation
 def gauss_hermite(n):
@@ -25,3 +26,27 @@ def c_s(d, c, w):
     speeds = set([ sqrt(sum([ w[i] * c_i[j]**2 for i, c_i in enumerate(c) ])) for j in range(0,d) ])
     assert len(speeds) == 1 # verify isotropy
     return speeds.pop()
+
+# determine a polynomial moment basis of velocity set c as the rows of a transformation matrix
+# along with the order of each moment (second order moments are split into their trace and
+# deviatoric differences s.t. bulk and shear viscosity may be relaxed separately)
+def moment_basis(d, c):
+    x = symbols('x:%d' % d)
+
+    polynomials = [ Mul(*[ x[j]**p[j] for j in range(d) ]) for p in product(range(3), repeat=d) ]
+    polynomials = [ p for p in polynomials if Poly(p, *x).total_degree() != 2 or not any([ p == x_j**2 for x_j in x ]) ]
+    polynomials.append(sum([ x_j**2 for x_j in x ]))
+    polynomials.extend([ x[j]**2 - x[j+1]**2 for j in range(d-1) ])
+
+    polynomials = sorted(polynomials, key = lambda p: Poly(p, *x).total_degree())
+
+    rows   = []
+    orders = []
+    for p in polynomials:
+        row = [ p.subs(dict(zip(x, c_i))) for c_i in c ]
+        if Matrix(rows + [ row ]).rank() > len(rows):
+            rows.append(row)
+            orders.append('bulk' if p == sum([ x_j**2 for x_j in x ]) else Poly(p, *x).total_degree())
+
+    assert len(rows) == len(c) # verify completeness
+    return Matrix(rows), orders
@@ -2,39 +2,53 @@ from sympy import *
 from sympy.codegen.ast import Assignment
 
 import symbolic.optimizations as optimizations
-from symbolic.characteristics import weights, c_s
+from symbolic.characteristics import weights, c_s, moment_basis
+from symbolic.cache import codegen_cache, descriptor_key, memoize
 
 
 def assign(names, definitions):
     return list(map(lambda x: Assignment(*x), zip(names, definitions)))
 
 class LBM:
-    def __init__(self, descriptor):
+    def __init__(self, descriptor, shifted = False):
         self.descriptor = descriptor
+        self.shifted    = shifted
         self.f_next = symarray('f_next', descriptor.q)
         self.f_curr = symarray('f_curr', descriptor.q)
 
         if not hasattr(descriptor, 'w'):
-            self.descriptor.w = weights(descriptor.d, descriptor.c)
+            self.descriptor.w = codegen_cache.get(
+                codegen_cache.key('weights', descriptor_key(descriptor)),
+                lambda: weights(descriptor.d, descriptor.c))
 
         if not hasattr(descriptor, 'c_s'):
-            self.descriptor.c_s = c_s(descriptor.d, descriptor.c, self.descriptor.w)
+            self.descriptor.c_s = codegen_cache.get(
+                codegen_cache.key('c_s', descriptor_key(descriptor)),
+                lambda: c_s(descriptor.d, descriptor.c, self.descriptor.w))
 
+    @memoize
     def moments(self, optimize = True):
         rho = symbols('rho')
         u   = Matrix(symarray('u', self.descriptor.d))
 
-        exprs = [ Assignment(rho, sum(self.f_curr)) ]
+        # shifted populations store the deviations f_i - w_i whose weights sum to one
+        if self.shifted:
+            rho_expr = 1 + sum(self.f_curr)
+        else:
+            rho_expr = sum(self.f_curr)
+
+        exprs = [ Assignment(rho, rho_expr) ]
 
         for i, u_i in enumerate(u):
             exprs.append(
-                Assignment(u_i, sum([ (c_j*self.f_curr[j])[i] for j, c_j in enumerate(self.descriptor.c) ]) / sum(self.f_curr)))
+                Assignment(u_i, sum([ (c_j*self.f_curr[j])[i] for j, c_j in enumerate(self.descriptor.c) ]) / rho_expr))
 
         if optimize:
             return cse(exprs, optimizations=optimizations.custom, symbols=numbered_symbols(prefix='m'))
         else:
             return ([], exprs)
 
+    @memoize
     def equilibrium(self):
         rho = symbols('rho')
         u   = Matrix(symarray('u', self.descriptor.d))
@@ -42,14 +56,20 @@ class LBM:
         f_eq = []
 
         for i, c_i in enumerate(self.descriptor.c):
-            f_eq_i = self.descriptor.w[i] * rho * ( 1
-                                                  + c_i.dot(u)    /    self.descriptor.c_s**2
-                                                  + c_i.dot(u)**2 / (2*self.descriptor.c_s**4)
-                                                  - u.dot(u)      / (2*self.descriptor.c_s**2) )
+            if self.shifted:
+                f_eq_i = self.descriptor.w[i] * (rho - 1) + self.descriptor.w[i] * rho * ( c_i.dot(u)    /    self.descriptor.c_s**2
+                                                                                         + c_i.dot(u)**2 / (2*self.descriptor.c_s**4)
+                                                                                         - u.dot(u)      / (2*self.descriptor.c_s**2) )
+            else:
+                f_eq_i = self.descriptor.w[i] * rho * ( 1
+                                                      + c_i.dot(u)    /    self.descriptor.c_s**2
+                                                      + c_i.dot(u)**2 / (2*self.descriptor.c_s**4)
+                                                      - u.dot(u)      / (2*self.descriptor.c_s**2) )
             f_eq.append(f_eq_i)
 
         return f_eq
 
+    @memoize
     def bgk(self, tau, f_eq, optimize = True):
         exprs = [ self.f_curr[i] + 1/tau * (f_eq_i - self.f_curr[i]) for i, f_eq_i in enumerate(f_eq) ]
 
@@ -58,3 +78,81 @@ class LBM:
             return (subexprs, assign(self.f_next, f))
         else:
             return ([], assign(self.f_next, exprs))
+
+    @memoize
+    def bgk_smagorinsky(self, tau, f_eq, c_smago = 0.1, optimize = True):
+        rho     = symbols('rho')
+        tau_eff = symbols('tau_eff')
+
+        # magnitude of the non-equilibrium momentum flux yields the local strain rate
+        f_neq  = [ self.f_curr[i] - f_eq_i for i, f_eq_i in enumerate(f_eq) ]
+        pi_neq = sum([ c_i * c_i.transpose() * f_neq[i] for i, c_i in enumerate(self.descriptor.c) ], zeros(self.descriptor.d))
+        q_neq  = sqrt(sum([ pi_ab**2 for pi_ab in pi_neq ]))
+
+        # effective relaxation time including the eddy viscosity of the Smagorinsky subgrid model
+        tau_eff_expr = (tau + sqrt(tau**2 + N(2*sqrt(2) * c_smago**2 / self.descriptor.c_s**4) * q_neq / rho)) / 2
+
+        exprs = [ self.f_curr[i] + 1/tau_eff * (f_eq_i - self.f_curr[i]) for i, f_eq_i in enumerate(f_eq) ]
+
+        if optimize:
+            # optimize the strain rate separately instead of inlining it into every population
+            tau_subexprs, tau_eff_expr = cse([ tau_eff_expr ], optimizations=optimizations.custom, symbols=numbered_symbols(prefix='s'))
+            subexprs, f = cse(exprs, optimizations=optimizations.custom)
+            return (tau_subexprs + [ (tau_eff, tau_eff_expr[0]) ] + subexprs, assign(self.f_next, f))
+        else:
+            return ([ (tau_eff, tau_eff_expr) ], assign(self.f_next, exprs))
+
+    @memoize
+    def trt(self, tau, f_eq, magic = Rational(3,16), optimize = True):
+        # the antisymmetric relaxation time follows from the magic parameter which
+        # fixes the location of bounce back walls independently of viscosity
+        tau_minus = Rational(1,2) + magic / (tau - Rational(1,2))
+
+        # momentum only deviates from its equilibrium where boundary conditions prescribe the
+        # velocity, its antisymmetric projection is relaxed at the shear rate to match BGK there
+        j = sum([ c_i * (self.f_curr[i] - f_eq[i]) for i, c_i in enumerate(self.descriptor.c) ], zeros(self.descriptor.d, 1))
+
+        exprs = []
+        for i, c_i in enumerate(self.descriptor.c):
+            k = self.descriptor.c.index(-c_i)
+            f_plus     = (self.f_curr[i] + self.f_curr[k]) / 2
+            f_minus    = (self.f_curr[i] - self.f_curr[k]) / 2
+            f_eq_plus  = (f_eq[i] + f_eq[k]) / 2
+            f_eq_minus = (f_eq[i] - f_eq[k]) / 2
+            j_minus    = self.descriptor.w[i] * c_i.dot(j) / self.descriptor.c_s**2
+            exprs.append(self.f_curr[i] - 1/tau * (f_plus - f_eq_plus) - 1/tau_minus * (f_minus - f_eq_minus - j_minus) - 1/tau * j_minus)
+
+        if optimize:
+            subexprs, f = cse(exprs, optimizations=optimizations.custom)
+            return (subexprs, assign(self.f_next, f))
+        else:
+            return ([], assign(self.f_next, exprs))
+
+    @memoize
+    def mrt(self, tau, f_eq, tau_bulk = None, tau_high = 1, optimize = True):
+        M, orders = codegen_cache.get(
+            codegen_cache.key('moment_basis', descriptor_key(self.descriptor)),
+            lambda: moment_basis(self.descriptor.d, self.descriptor.c))
+
+        # conserved moments only deviate from their equilibrium where boundary conditions
+        # prescribe the velocity, they are relaxed at the shear rate to match BGK there
+        rates = {
+            0:      1/tau,
+            1:      1/tau,
+            'bulk': 1/tau if tau_bulk == None else 1/tau_bulk,
+            2:      1/tau
+        }
+
+        f_curr = Matrix(self.f_curr)
+        f_eq   = Matrix(f_eq)
+
+        dm = [ rates.get(order, 1/tau_high) * (M.row(k).dot(f_curr) - M.row(k).dot(f_eq)) for k, order in enumerate(orders) ]
+
+        M_inv = M.inv()
+        exprs = [ self.f_curr[i] - sum([ M_inv[i,k] * dm_k for k, dm_k in enumerate(dm) ]) for i in range(self.descriptor.q) ]
+
+        if optimize:
+            subexprs, f = cse(exprs, optimizations=optimizations.custom)
+            return (subexprs, assign(self.f_next, f))
+        else:
+            return ([], assign(self.f_next, exprs))
@@ -0,0 +1,67 @@
+% if float_type == 'double':
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+#elif defined(cl_amd_fp64)
+#pragma OPENCL EXTENSION cl_amd_fp64 : enable
+#endif
+% endif
+
+<%
+def gid():
+    return {
+        2: 'get_global_id(1)*%d + get_global_id(0)' % memory.size_x,
+        3: 'get_global_id(2)*%d + get_global_id(1)*%d + get_global_id(0)' % (memory.size_x*memory.size_y, memory.size_x)
+    }.get(descriptor.d)
+
+def pop_offset(i, n = 0):
+    return memory.layout.offset(i, 'gid + %d' % n if n != 0 else 'gid')
+
+def neighbor_offset(c_i):
+    return {
+        2: lambda:                                      c_i[1]*memory.size_x + c_i[0],
+        3: lambda: c_i[2]*memory.size_x*memory.size_y + c_i[1]*memory.size_x + c_i[0]
+    }.get(descriptor.d)()
+%>
+
+__kernel void copy(__global ${memory.storage.type}* f_next,
+                   __global ${memory.storage.type}* f_prev)
+{
+    const unsigned int gid = ${gid()};
+
+% for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), memory.storage.load('f_prev', pop_offset(i)))};
+% endfor
+}
+
+__kernel void triad(__global ${memory.storage.type}* f_next,
+                    __global ${memory.storage.type}* f_a,
+                    __global ${memory.storage.type}* f_b,
+                    ${float_type} scalar)
+{
+    const unsigned int gid = ${gid()};
+
+% for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), '%s + scalar * %s' % (memory.storage.load('f_a', pop_offset(i)), memory.storage.load('f_b', pop_offset(i))))};
+% endfor
+}
+
+__kernel void stream(__global ${memory.storage.type}* f_next,
+                     __global ${memory.storage.type}* f_prev,
+                     __global int* material)
+{
+    const unsigned int gid = ${gid()};
+
+    const int m = material[gid];
+
+    if ( m == 0 ) {
+        return;
+    }
+
+% for i, c_i in enumerate(descriptor.c):
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f_prev', pop_offset(i, neighbor_offset(-c_i)))};
+% endfor
+
+% for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), 'f_curr_%d' % i)};
+% endfor
+}
@@ -13,22 +13,28 @@ def gid():
         3: 'get_global_id(2)*%d + get_global_id(1)*%d + get_global_id(0)' % (memory.size_x*memory.size_y, memory.size_x)
     }.get(descriptor.d)
 
-def pop_offset(i):
-    return i * memory.volume
+def pop_offset(i, n = 0):
+    return memory.layout.offset(i, 'gid + %d' % n if n != 0 else 'gid')
+
+def rest_population(i):
+    return '0.f' if shifted else '%s.f' % descriptor.w[i]
+
+def moments_cell():
+    return {
+        2: '(int2)(get_global_id(0), get_global_id(1))',
+        3: '(int4)(get_global_id(0), get_global_id(1), get_global_id(2), 0)'
+    }.get(descriptor.d)
 %>
 
-__kernel void equilibrilize(__global ${float_type}* f_next,
-                            __global ${float_type}* f_prev)
+__kernel void equilibrilize(__global ${memory.storage.type}* f_next,
+                            __global ${memory.storage.type}* f_prev)
 {
     const unsigned int gid = ${gid()};
 
-    __global ${float_type}* preshifted_f_next = f_next + gid;
-    __global ${float_type}* preshifted_f_prev = f_prev + gid;
-
 % if pop_eq_src == '':
-%     for i, w_i in enumerate(descriptor.w):
-    preshifted_f_next[${pop_offset(i)}] = ${w_i}.f;
-    preshifted_f_prev[${pop_offset(i)}] = ${w_i}.f;
+%     for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), rest_population(i))};
+    ${memory.storage.store('f_prev', pop_offset(i), rest_population(i))};
 %     endfor
 % else:
     ${pop_eq_src}
@@ -42,60 +48,212 @@ def neighbor_offset(c_i):
         3: lambda: c_i[2]*memory.size_x*memory.size_y + c_i[1]*memory.size_x + c_i[0]
     }.get(descriptor.d)()
 
+def opposite(i):
+    return descriptor.c.index(-descriptor.c[i])
+
 %>
 
-__kernel void collide_and_stream(__global ${float_type}* f_next,
-                                 __global ${float_type}* f_prev,
+<%def name="collide()">
+% for i, expr in enumerate(moments_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+
+% for i, expr in enumerate(moments_assignment):
+    ${float_type} ${ccode(expr)}
+% endfor
+
+  ${boundary_src}
+
+% for i, expr in enumerate(collide_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+
+% for i, expr in enumerate(collide_assignment):
+    const ${float_type} ${ccode(expr)}
+% endfor
+</%def>
+
+<%def name="output_args(output)">\
+% if output == 'moments':
+,
+                                 __global ${float_type}* moments\
+% elif output == 'texture':
+,
+% if descriptor.d == 2:
+                                 __write_only image2d_t moments,
+% elif descriptor.d == 3:
+                                 __write_only image3d_t moments,
+% endif
+                                 int include_materials\
+% endif
+</%def>
+
+<%def name="store_moments(output)">
+% if output == 'moments':
+% for i, expr in enumerate(moments_assignment):
+    moments[${memory.moments_layout.offset(i, 'gid')}] = ${ccode(expr.lhs)};
+% endfor
+% elif output == 'texture':
+    float4 data;
+
+    if (include_materials && m != 1) {
+      data.x = 0.0;
+      data.y = 0.0;
+      data.z = 0.0;
+      data.w = -m;
+    } else {
+      data.x = ${ccode(moments_assignment[0].lhs)};
+      data.y = ${ccode(moments_assignment[1].lhs)};
+      data.z = ${ccode(moments_assignment[2].lhs)};
+% if descriptor.d == 2:
+      data.w = sqrt(data.y*data.y + data.z*data.z);
+% elif descriptor.d == 3:
+      data.w = ${ccode(moments_assignment[3].lhs)};
+% endif
+    }
+
+    write_imagef(moments, ${moments_cell()}, data);
+% endif
+</%def>
+
+<%def name="store_ghost_moments(output)">
+% if output != None:
+    {
+        // ghost cells are at rest
+% for i in range(0,descriptor.q):
+        const ${float_type} f_curr_${i} = ${rest_population(i)};
+% endfor
+% for i, expr in enumerate(moments_subexpr):
+        const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+% for i, expr in enumerate(moments_assignment):
+        const ${float_type} ${ccode(expr)}
+% endfor
+${store_moments(output)}
+    }
+% endif
+</%def>
+
+<%def name="collide_and_stream_ab(name, output)">
+__kernel void ${name}(__global ${memory.storage.type}* f_next,
+                                 __global ${memory.storage.type}* f_prev,
                                  __global int* material,
-                                 unsigned int time)
+                                 unsigned int time${output_args(output)})
 {
     const unsigned int gid = ${gid()};
 
     const int m = material[gid];
 
     if ( m == 0 ) {
+${store_ghost_moments(output)}
         return;
     }
 
-    __global ${float_type}* preshifted_f_next = f_next + gid;
-    __global ${float_type}* preshifted_f_prev = f_prev + gid;
-
 % for i, c_i in enumerate(descriptor.c):
-    const ${float_type} f_curr_${i} = preshifted_f_prev[${pop_offset(i) + neighbor_offset(-c_i)}];
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f_prev', pop_offset(i, neighbor_offset(-c_i)))};
 % endfor
 
-% for i, expr in enumerate(moments_subexpr):
-    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
-% endfor
+${collide()}
 
-% for i, expr in enumerate(moments_assignment):
-    ${float_type} ${ccode(expr)}
+% for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), 'f_next_%d' % i)};
 % endfor
+${store_moments(output)}
+}
+</%def>
 
-  ${boundary_src}
+<%def name="collide_and_stream_even(name, output)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                                      __global int* material,
+                                      unsigned int time${output_args(output)})
+{
+    const unsigned int gid = ${gid()};
 
-% for i, expr in enumerate(collide_subexpr):
-    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+    const int m = material[gid];
+
+    if ( m == 0 ) {
+        // ghost cells emit constant equilibrium populations
+% for i in range(0,descriptor.q):
+        ${memory.storage.store('f', pop_offset(opposite(i)), rest_population(i))};
 % endfor
+${store_ghost_moments(output)}
+        return;
+    }
 
-% for i, expr in enumerate(collide_assignment):
-    const ${float_type} ${ccode(expr)}
+% for i in range(0,descriptor.q):
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
 % endfor
 
+${collide()}
+
 % for i in range(0,descriptor.q):
-    preshifted_f_next[${pop_offset(i)}] = f_next_${i};
+    ${memory.storage.store('f', pop_offset(opposite(i)), 'f_next_%d' % i)};
 % endfor
+${store_moments(output)}
 }
+</%def>
 
-__kernel void collect_moments(__global ${float_type}* f,
-                              __global ${float_type}* moments)
+<%def name="collide_and_stream_odd(name, output)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                                     __global int* material,
+                                     unsigned int time${output_args(output)})
 {
     const unsigned int gid = ${gid()};
 
-    __global ${float_type}* preshifted_f = f + gid;
+    const int m = material[gid];
+
+    if ( m == 0 ) {
+        // ghost cells emit constant equilibrium populations
+% for i, c_i in enumerate(descriptor.c):
+        if ( gid + ${neighbor_offset(c_i)} < ${memory.volume} ) {
+            ${memory.storage.store('f', pop_offset(i, neighbor_offset(c_i)), rest_population(i))};
+        }
+% endfor
+${store_ghost_moments(output)}
+        return;
+    }
+
+% for i, c_i in enumerate(descriptor.c):
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(opposite(i), neighbor_offset(-c_i)))};
+% endfor
+
+${collide()}
+
+% for i, c_i in enumerate(descriptor.c):
+    ${memory.storage.store('f', pop_offset(i, neighbor_offset(c_i)), 'f_next_%d' % i)};
+% endfor
+${store_moments(output)}
+}
+</%def>
+
+<%
+# fused variants additionally write the moments of the updated cells
+outputs = [ (None, ''), ('moments', '_moments') ] + ([ ('texture', '_gl_moments') ] if opengl else [ ])
+%>
+
+% for output, suffix in outputs:
+% if memory.streaming == 'AB':
+${collide_and_stream_ab('collide_and_stream' + suffix, output)}
+% elif memory.streaming == 'AA':
+${collide_and_stream_even('collide_and_stream_even' + suffix, output)}
+${collide_and_stream_odd('collide_and_stream_odd' + suffix, output)}
+% endif
+% endfor
+
+<%def name="collect_moments(name, swapped)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                      __global ${float_type}* moments)
+{
+    const unsigned int gid = ${gid()};
 
 % for i in range(0,descriptor.q):
-    const ${float_type} f_curr_${i} = preshifted_f[${pop_offset(i)}];
+%     if swapped:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(opposite(i)))};
+%     elif memory.streaming == 'AA':
+    const ${float_type} f_curr_${i} = gid + ${neighbor_offset(descriptor.c[i])} < ${memory.volume} ? ${memory.storage.load('f', pop_offset(i, neighbor_offset(descriptor.c[i])))} : ${rest_population(i)};
+%     else:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
+%     endif
 % endfor
 
 % for i, expr in enumerate(moments_subexpr):
@@ -103,6 +261,12 @@ __kernel void collect_moments(__global ${float_type}* f,
 % endfor
 
 % for i, expr in enumerate(moments_assignment):
-    moments[${pop_offset(i)} + gid] = ${ccode(expr.rhs)};
+    moments[${memory.moments_layout.offset(i, 'gid')}] = ${ccode(expr.rhs)};
 % endfor
-}
\ No newline at end of file
+}
+</%def>
+
+${collect_moments('collect_moments', False)}
+% if memory.streaming == 'AA':
+${collect_moments('collect_moments_swapped', True)}
+% endif
@@ -5,8 +5,8 @@ def gid():
         3: 'get_global_id(2)*%d + get_global_id(1)*%d + get_global_id(0)' % (memory.size_x*memory.size_y, memory.size_x)
     }.get(descriptor.d)
 
-def pop_offset(i):
-    return i * memory.volume
+def pop_offset(i, n = 0):
+    return memory.layout.offset(i, 'gid + %d' % n if n != 0 else 'gid')
 
 def moments_cell():
     return {
@@ -20,22 +20,33 @@ def neighbor_offset(c_i):
         3: lambda: c_i[2]*memory.size_x*memory.size_y + c_i[1]*memory.size_x + c_i[0]
     }.get(descriptor.d)()
 
+def opposite(i):
+    return descriptor.c.index(-descriptor.c[i])
+
+def rest_population(i):
+    return '0.f' if shifted else '%s.f' % descriptor.w[i]
+
 %>
 
-__kernel void collect_gl_moments_and_materials_to_texture(__global ${float_type}* f,
-                                                          __global int* material,
+<%def name="collect_gl_moments_and_materials_to_texture(name, swapped)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                      __global int* material,
 % if descriptor.d == 2:
-                                                          __write_only image2d_t moments)
+                      __write_only image2d_t moments)
 % elif descriptor.d == 3:
-                                                          __write_only image3d_t moments)
+                      __write_only image3d_t moments)
 % endif
 {
     const unsigned int gid = ${gid()};
 
-    __global ${float_type}* preshifted_f = f + gid;
-
 % for i in range(0,descriptor.q):
-    const ${float_type} f_curr_${i} = preshifted_f[${pop_offset(i)}];
+%     if swapped:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(opposite(i)))};
+%     elif memory.streaming == 'AA':
+    const ${float_type} f_curr_${i} = gid + ${neighbor_offset(descriptor.c[i])} < ${memory.volume} ? ${memory.storage.load('f', pop_offset(i, neighbor_offset(descriptor.c[i])))} : ${rest_population(i)};
+%     else:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
+%     endif
 % endfor
 
 % for i, expr in enumerate(moments_subexpr):
@@ -65,20 +76,26 @@ __kernel void collect_gl_moments_and_materials_to_texture(__global ${float_type}
 
     write_imagef(moments, ${moments_cell()}, data);
 }
+</%def>
 
-__kernel void collect_gl_moments_to_texture(__global ${float_type}* f,
+<%def name="collect_gl_moments_to_texture(name, swapped)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
 % if descriptor.d == 2:
-                                            __write_only image2d_t moments)
+                      __write_only image2d_t moments)
 % elif descriptor.d == 3:
-                                            __write_only image3d_t moments)
+                      __write_only image3d_t moments)
 % endif
 {
     const unsigned int gid = ${gid()};
 
-    __global ${float_type}* preshifted_f = f + gid;
-
 % for i in range(0,descriptor.q):
-    const ${float_type} f_curr_${i} = preshifted_f[${pop_offset(i)}];
+%     if swapped:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(opposite(i)))};
+%     elif memory.streaming == 'AA':
+    const ${float_type} f_curr_${i} = gid + ${neighbor_offset(descriptor.c[i])} < ${memory.volume} ? ${memory.storage.load('f', pop_offset(i, neighbor_offset(descriptor.c[i])))} : ${rest_population(i)};
+%     else:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
+%     endif
 % endfor
 
 % for i, expr in enumerate(moments_subexpr):
@@ -101,3 +118,11 @@ __kernel void collect_gl_moments_to_texture(__global ${float_type}* f,
 
     write_imagef(moments, ${moments_cell()}, data);
 }
+</%def>
+
+${collect_gl_moments_and_materials_to_texture('collect_gl_moments_and_materials_to_texture', False)}
+${collect_gl_moments_to_texture('collect_gl_moments_to_texture', False)}
+% if memory.streaming == 'AA':
+${collect_gl_moments_and_materials_to_texture('collect_gl_moments_and_materials_to_texture_swapped', True)}
+${collect_gl_moments_to_texture('collect_gl_moments_to_texture_swapped', True)}
+% endif
@@ -0,0 +1,136 @@
+<%
+d = descriptor.d
+axes = [ 'x', 'y', 'z' ][:d]
+
+radix = 2**radix_bits
+%>
+
+__kernel void morton_keys(__global float4* particles,
+                          __global uint*   keys,
+                          __global uint*   indices)
+{
+  const unsigned int pid = get_global_id(0);
+
+  if (pid >= ${count}) {
+    return;
+  }
+
+  const float4 particle = particles[pid];
+
+% for axis, size in zip(axes, memory.size()):
+  const uint ${axis} = clamp((int)floor(particle.${axis}), 0, ${size-1});
+% endfor
+
+  // interleave the cell coordinate bits into a Z-order curve
+  uint key = 0;
+  for (uint bit = 0; bit < ${key_bits // d}; ++bit) {
+% for k, axis in enumerate(axes):
+    key |= ((${axis} >> bit) & 1) << (${d}*bit + ${k});
+% endfor
+  }
+
+  keys[pid]    = key;
+  indices[pid] = pid;
+}
+
+// each work item processes one chunk of keys sequentially which keeps every pass stable
+__kernel void radix_histogram(__global uint* keys,
+                              __global uint* histogram,
+                              uint shift)
+{
+  const unsigned int chunk = get_global_id(0);
+
+  uint count[${radix}];
+  for (uint digit = 0; digit < ${radix}; ++digit) {
+    count[digit] = 0;
+  }
+
+  const uint end = min((chunk+1)*${chunk_size}, ${count}u);
+  for (uint i = chunk*${chunk_size}; i < end; ++i) {
+    count[(keys[i] >> shift) & ${radix-1}] += 1;
+  }
+
+  for (uint digit = 0; digit < ${radix}; ++digit) {
+    histogram[digit*${chunks} + chunk] = count[digit];
+  }
+}
+
+// exclusive prefix sum of the digit-major histogram using a single work group
+__kernel void radix_scan(__global uint* histogram,
+                         __local  uint* partial)
+{
+  const unsigned int lid  = get_local_id(0);
+  const unsigned int size = get_local_size(0);
+
+  const uint n       = ${radix*chunks};
+  const uint segment = (n + size - 1) / size;
+  const uint begin   = min(lid*segment, n);
+  const uint end     = min(begin + segment, n);
+
+  uint sum = 0;
+  for (uint i = begin; i < end; ++i) {
+    sum += histogram[i];
+  }
+  partial[lid] = sum;
+
+  barrier(CLK_LOCAL_MEM_FENCE);
+
+  if (lid == 0) {
+    uint offset = 0;
+    for (uint i = 0; i < size; ++i) {
+      const uint value = partial[i];
+      partial[i] = offset;
+      offset += value;
+    }
+  }
+
+  barrier(CLK_LOCAL_MEM_FENCE);
+
+  uint offset = partial[lid];
+  for (uint i = begin; i < end; ++i) {
+    const uint value = histogram[i];
+    histogram[i] = offset;
+    offset += value;
+  }
+}
+
+__kernel void radix_scatter(__global uint* keys,
+                            __global uint* indices,
+                            __global uint* sorted_keys,
+                            __global uint* sorted_indices,
+                            __global uint* histogram,
+                            uint shift)
+{
+  const unsigned int chunk = get_global_id(0);
+
+  uint offset[${radix}];
+  for (uint digit = 0; digit < ${radix}; ++digit) {
+    offset[digit] = histogram[digit*${chunks} + chunk];
+  }
+
+  const uint end = min((chunk+1)*${chunk_size}, ${count}u);
+  for (uint i = chunk*${chunk_size}; i < end; ++i) {
+    const uint key = keys[i];
+    const uint target = offset[(key >> shift) & ${radix-1}]++;
+    sorted_keys[target]    = key;
+    sorted_indices[target] = indices[i];
+  }
+}
+
+__kernel void permute_particles(__global float4* particles,
+                                __global float4* init_particles,
+                                __global float4* sorted_particles,
+                                __global float4* sorted_init_particles,
+                                __global uint*   indices)
+{
+  const unsigned int pid = get_global_id(0);
+
+  if (pid >= ${count}) {
+    return;
+  }
+
+  const uint source = indices[pid];
+
+  sorted_particles[pid]      = particles[source];
+  sorted_init_particles[pid] = init_particles[source];
+}
@@ -1,30 +1,144 @@
-__kernel void update_particles(__global float*  moments,
-                               __global int*    material,
-                               __global float4* particles,
-                               __global float4* init_particles,
-                               float aging)
+% if float_type == 'double':
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+#elif defined(cl_amd_fp64)
+#pragma OPENCL EXTENSION cl_amd_fp64 : enable
+#endif
+% endif
+
+<%
+d = descriptor.d
+axes = [ 'x', 'y', 'z' ][:d]
+
+vec = { 2: 'float2', 3: 'float3' }.get(d)
+
+def gid():
+    return {
+        2: 'y*%d + x' % memory.size_x,
+        3: 'z*%d + y*%d + x' % (memory.size_x*memory.size_y, memory.size_x)
+    }.get(d)
+
+def particle_gid():
+    return {
+        2: 'floor(particle.y)*%d + floor(particle.x)' % memory.size_x,
+        3: 'floor(particle.z)*%d + floor(particle.y)*%d + floor(particle.x)' % (memory.size_x*memory.size_y, memory.size_x)
+    }.get(d)
+
+def pop_offset(i, n = 0):
+    return memory.layout.offset(i, 'gid + %d' % n if n != 0 else 'gid')
+
+def neighbor_offset(c_i):
+    return {
+        2: lambda:                                      c_i[1]*memory.size_x + c_i[0],
+        3: lambda: c_i[2]*memory.size_x*memory.size_y + c_i[1]*memory.size_x + c_i[0]
+    }.get(d)()
+
+def opposite(i):
+    return descriptor.c.index(-descriptor.c[i])
+
+def rest_population(i):
+    return '0.f' if shifted else '%s.f' % descriptor.w[i]
+%>
+
+<%def name="velocity(name, swapped)">
+${vec} ${name}(__global ${memory.storage.type}* f,
+               __global int* material,
+               ${', '.join([ 'int %s' % axis for axis in axes ])})
+{
+% for axis, size in zip(axes, memory.size()):
+    ${axis} = clamp(${axis}, 0, ${size-1});
+% endfor
+    const unsigned int gid = ${gid()};
+
+    // only fluid cells contribute their velocity
+    if (material[gid] != 1) {
+        return (${vec})(0.f);
+    }
+
+% for i in range(0,descriptor.q):
+%     if swapped:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(opposite(i)))};
+%     elif memory.streaming == 'AA':
+    const ${float_type} f_curr_${i} = gid + ${neighbor_offset(descriptor.c[i])} < ${memory.volume} ? ${memory.storage.load('f', pop_offset(i, neighbor_offset(descriptor.c[i])))} : ${rest_population(i)};
+%     else:
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
+%     endif
+% endfor
+
+% for i, expr in enumerate(moments_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+
+% for i, expr in enumerate(moments_assignment):
+    const ${float_type} ${ccode(expr)}
+% endfor
+
+    return (${vec})(${', '.join([ '(float)%s' % ccode(expr.lhs) for expr in moments_assignment[1:] ])});
+}
+</%def>
+
+<%def name="interpolate(name, velocity)">
+${vec} ${name}(__global ${memory.storage.type}* f,
+               __global int* material,
+               float4 p)
+{
+    // velocities are sampled at cell centers
+% for axis in axes:
+    const float q${axis} = p.${axis} - 0.5f;
+    const int   ${axis}0 = floor(q${axis});
+    const float t${axis} = q${axis} - ${axis}0;
+% endfor
+
+% if d == 2:
+    return mix(mix(${velocity}(f, material, x0, y0  ), ${velocity}(f, material, x0+1, y0  ), tx),
+               mix(${velocity}(f, material, x0, y0+1), ${velocity}(f, material, x0+1, y0+1), tx), ty);
+% elif d == 3:
+    return mix(mix(mix(${velocity}(f, material, x0, y0,   z0  ), ${velocity}(f, material, x0+1, y0,   z0  ), tx),
+                   mix(${velocity}(f, material, x0, y0+1, z0  ), ${velocity}(f, material, x0+1, y0+1, z0  ), tx), ty),
+               mix(mix(${velocity}(f, material, x0, y0,   z0+1), ${velocity}(f, material, x0+1, y0,   z0+1), tx),
+                   mix(${velocity}(f, material, x0, y0+1, z0+1), ${velocity}(f, material, x0+1, y0+1, z0+1), tx), ty), tz);
+% endif
+}
+</%def>
+
+<%def name="update_particles(name, interpolate)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                      __global int*    material,
+                      __global float4* particles,
+                      __global float4* init_particles,
+                      float aging,
+                      unsigned int steps)
 {
   const unsigned int pid = get_global_id(0);
 
   float4 particle = particles[pid];
 
-% if descriptor.d == 2:
-  const unsigned int gid = floor(particle.y)*${memory.size_x} + floor(particle.x);
-% elif descriptor.d == 3:
-  const unsigned int gid = floor(particle.z)*${memory.size_x*memory.size_y} + floor(particle.y)*${memory.size_x} + floor(particle.x);
-% endif
+  for (unsigned int step = 0; step < steps; ++step) {
+    const unsigned int gid = ${particle_gid()};
 
-  if (material[gid] == 1 && particle.w < 1.0) {
-    particle.x += moments[${1*memory.volume}+gid];
-    particle.y += moments[${2*memory.volume}+gid];
-% if descriptor.d == 3:
-    particle.z += moments[${3*memory.volume}+gid];
-% endif
-    particle.w += min(particle.x, particle.y) * aging;
-  } else {
-    particle.xyz = init_particles[pid].xyz;
-    particle.w   = particle.w-1.0;
+    if (material[gid] == 1 && particle.w < 1.0) {
+      // explicit midpoint rule in the velocity field of the current populations
+      const ${vec} u = ${interpolate}(f, material, particle);
+      float4 midpoint = particle;
+      midpoint.${''.join(axes)} += 0.5f * u;
+      particle.${''.join(axes)} += ${interpolate}(f, material, midpoint);
+      particle.w += min(particle.x, particle.y) * aging;
+    } else {
+      particle.xyz = init_particles[pid].xyz;
+      particle.w   = particle.w-1.0;
+    }
   }
 
   particles[pid] = particle;
 }
+</%def>
+
+${velocity('velocity', False)}
+${interpolate('interpolate_velocity', 'velocity')}
+${update_particles('update_particles', 'interpolate_velocity')}
+
+% if memory.streaming == 'AA':
+${velocity('velocity_swapped', True)}
+${interpolate('interpolate_velocity_swapped', 'velocity_swapped')}
+${update_particles('update_particles_swapped', 'interpolate_velocity_swapped')}
+% endif
@@ -0,0 +1,228 @@
+% if float_type == 'double':
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+#elif defined(cl_amd_fp64)
+#pragma OPENCL EXTENSION cl_amd_fp64 : enable
+#endif
+% endif
+
+<%
+def pop_offset(i, n = 0):
+    return memory.layout.offset(i, 'gid + %d' % n if n != 0 else 'gid')
+
+def neighbor_offset(c_i):
+    return {
+        2: lambda:                                      c_i[1]*memory.size_x + c_i[0],
+        3: lambda: c_i[2]*memory.size_x*memory.size_y + c_i[1]*memory.size_x + c_i[0]
+    }.get(descriptor.d)()
+
+def opposite(i):
+    return descriptor.c.index(-descriptor.c[i])
+
+def rest_population(i):
+    return '0.f' if shifted else '%s.f' % descriptor.w[i]
+
+def in_geometry():
+    return {
+        2: 'gid %% %d < %d && gid / %d < %d' % (memory.size_x, geometry.size_x, memory.size_x, geometry.size_y),
+        3: 'gid %% %d < %d && gid / %d %% %d < %d && gid / %d < %d' % (
+            memory.size_x, geometry.size_x,
+            memory.size_x, memory.size_y, geometry.size_y,
+            memory.size_x*memory.size_y, geometry.size_z)
+    }.get(descriptor.d)
+%>
+
+<%def name="collect_moments(swapped)">
+% for i in range(0,descriptor.q):
+%     if swapped:
+        const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(opposite(i)))};
+%     elif memory.streaming == 'AA':
+        const ${float_type} f_curr_${i} = gid + ${neighbor_offset(descriptor.c[i])} < ${memory.volume} ? ${memory.storage.load('f', pop_offset(i, neighbor_offset(descriptor.c[i])))} : ${rest_population(i)};
+%     else:
+        const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
+%     endif
+% endfor
+
+% for i, expr in enumerate(moments_subexpr):
+        const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+
+% for i, expr in enumerate(moments_assignment):
+        const ${float_type} ${ccode(expr)}
+% endfor
+</%def>
+
+<%def name="reduce_local(sums, maxima)">
+    barrier(CLK_LOCAL_MEM_FENCE);
+
+    for (unsigned int s = ${group_size // 2}; s > 0; s >>= 1) {
+        if (lid < s) {
+% for name in sums:
+            ${name}[lid] += ${name}[lid + s];
+% endfor
+% for name in maxima:
+            ${name}[lid] = fmax(${name}[lid], ${name}[lid + s]);
+% endfor
+        }
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+</%def>
+
+<%def name="reduce_cells(name, swapped)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                      __global int* material,
+                      __global ${float_type}* partial,
+                      __global unsigned int* partial_cells)
+{
+    const unsigned int gid = get_global_id(0);
+    const unsigned int lid = get_local_id(0);
+
+    __local ${float_type} mass[${group_size}];
+    __local ${float_type} energy[${group_size}];
+    __local ${float_type} max_u[${group_size}];
+    __local unsigned int  cells[${group_size}];
+    __local unsigned int  fluid[${group_size}];
+
+    mass[lid]   = 0.0;
+    energy[lid] = 0.0;
+    max_u[lid]  = 0.0;
+    cells[lid]  = 0;
+    fluid[lid]  = 0;
+
+    if ( gid < ${memory.volume} && ${in_geometry()} && material[gid] != 0 ) {
+${collect_moments(swapped)}
+        const ${float_type} u_squared = ${' + '.join([ 'u_%d*u_%d' % (i, i) for i in range(descriptor.d) ])};
+
+        mass[lid]   = rho;
+        energy[lid] = 0.5 * rho * u_squared;
+        max_u[lid]  = sqrt(u_squared);
+        cells[lid]  = 1;
+        fluid[lid]  = material[gid] == 1;
+    }
+
+${reduce_local(['mass', 'energy', 'cells', 'fluid'], ['max_u'])}
+    if (lid == 0) {
+        partial[3*get_group_id(0) + 0] = mass[0];
+        partial[3*get_group_id(0) + 1] = energy[0];
+        partial[3*get_group_id(0) + 2] = max_u[0];
+        partial_cells[2*get_group_id(0) + 0] = cells[0];
+        partial_cells[2*get_group_id(0) + 1] = fluid[0];
+    }
+}
+</%def>
+
+<%def name="residual_cells(name, swapped)">
+__kernel void ${name}(__global ${memory.storage.type}* f,
+                      __global int* material,
+                      __global ${float_type}* u_prev,
+                      __global ${float_type}* partial)
+{
+    const unsigned int gid = get_global_id(0);
+    const unsigned int lid = get_local_id(0);
+
+    __local ${float_type} du_squared[${group_size}];
+    __local ${float_type} u_squared[${group_size}];
+    __local ${float_type} max_du[${group_size}];
+    __local ${float_type} max_u[${group_size}];
+
+    du_squared[lid] = 0.0;
+    u_squared[lid]  = 0.0;
+    max_du[lid]     = 0.0;
+    max_u[lid]      = 0.0;
+
+    if ( gid < ${memory.volume} && ${in_geometry()} && material[gid] != 0 ) {
+${collect_moments(swapped)}
+% for i in range(descriptor.d):
+        const ${float_type} du_${i} = u_${i} - u_prev[${i*memory.volume} + gid];
+        u_prev[${i*memory.volume} + gid] = u_${i};
+% endfor
+
+        du_squared[lid] = ${' + '.join([ 'du_%d*du_%d' % (i, i) for i in range(descriptor.d) ])};
+        u_squared[lid]  = ${' + '.join([ 'u_%d*u_%d' % (i, i) for i in range(descriptor.d) ])};
+        max_du[lid]     = sqrt(du_squared[lid]);
+        max_u[lid]      = sqrt(u_squared[lid]);
+    }
+
+${reduce_local(['du_squared', 'u_squared'], ['max_du', 'max_u'])}
+    if (lid == 0) {
+        partial[4*get_group_id(0) + 0] = du_squared[0];
+        partial[4*get_group_id(0) + 1] = u_squared[0];
+        partial[4*get_group_id(0) + 2] = max_du[0];
+        partial[4*get_group_id(0) + 3] = max_u[0];
+    }
+}
+</%def>
+
+${reduce_cells('reduce_cells', False)}
+${residual_cells('residual_cells', False)}
+% if memory.streaming == 'AA':
+${reduce_cells('reduce_cells_swapped', True)}
+${residual_cells('residual_cells_swapped', True)}
+% endif
+
+__kernel void reduce_partials(__global ${float_type}* partial,
+                              __global unsigned int* partial_cells,
+                              __global ${float_type}* result,
+                              __global unsigned int* result_cells)
+{
+    const unsigned int lid = get_local_id(0);
+
+    __local ${float_type} mass[${group_size}];
+    __local ${float_type} energy[${group_size}];
+    __local ${float_type} max_u[${group_size}];
+    __local unsigned int  cells[${group_size}];
+    __local unsigned int  fluid[${group_size}];
+
+    mass[lid]   = 0.0;
+    energy[lid] = 0.0;
+    max_u[lid]  = 0.0;
+    cells[lid]  = 0;
+    fluid[lid]  = 0;
+
+    for (unsigned int group = lid; group < ${groups}; group += ${group_size}) {
+        mass[lid]   += partial[3*group + 0];
+        energy[lid] += partial[3*group + 1];
+        max_u[lid]   = fmax(max_u[lid], partial[3*group + 2]);
+        cells[lid]  += partial_cells[2*group + 0];
+        fluid[lid]  += partial_cells[2*group + 1];
+    }
+
+${reduce_local(['mass', 'energy', 'cells', 'fluid'], ['max_u'])}
+    if (lid == 0) {
+        result[0] = mass[0];
+        result[1] = energy[0];
+        result[2] = max_u[0];
+        result_cells[0] = cells[0];
+        result_cells[1] = fluid[0];
+    }
+}
+
+__kernel void reduce_residual(__global ${float_type}* partial,
+                              __global ${float_type}* history,
+                              unsigned int slot)
+{
+    const unsigned int lid = get_local_id(0);
+
+    __local ${float_type} du_squared[${group_size}];
+    __local ${float_type} u_squared[${group_size}];
+    __local ${float_type} max_du[${group_size}];
+    __local ${float_type} max_u[${group_size}];
+
+    du_squared[lid] = 0.0;
+    u_squared[lid]  = 0.0;
+    max_du[lid]     = 0.0;
+    max_u[lid]      = 0.0;
+
+    for (unsigned int group = lid; group < ${groups}; group += ${group_size}) {
+        du_squared[lid] += partial[4*group + 0];
+        u_squared[lid]  += partial[4*group + 1];
+        max_du[lid]      = fmax(max_du[lid], partial[4*group + 2]);
+        max_u[lid]       = fmax(max_u[lid],  partial[4*group + 3]);
+    }
+
+${reduce_local(['du_squared', 'u_squared'], ['max_du', 'max_u'])}
+    if (lid == 0) {
+        history[2*slot + 0] = u_squared[0] > 0.0 ? sqrt(du_squared[0] / u_squared[0]) : 0.0;
+        history[2*slot + 1] = max_u[0]     > 0.0 ? max_du[0] / max_u[0]                 : 0.0;
+    }
+}
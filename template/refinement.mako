@@ -0,0 +1,195 @@
+% if float_type == 'double':
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+#elif defined(cl_amd_fp64)
+#pragma OPENCL EXTENSION cl_amd_fp64 : enable
+#endif
+% endif
+
+<%
+from itertools import product
+
+d = descriptor.d
+
+def linear(memory, coordinates):
+    strides = [ 1, memory.size_x, memory.size_x*memory.size_y ][:d]
+    return ' + '.join([ '(%s)*%d' % (x, stride) for x, stride in zip(coordinates, strides) ])
+
+def neighbor_offset(memory, c_i):
+    return linear(memory, [ str(c_i[k]) for k in range(d) ])
+
+def pop_offset(memory, i, cell, n = None):
+    return memory.layout.offset(i, '%s + %s' % (cell, n) if n != None else cell)
+
+halo_origin = [ x - 1 for x in origin ]
+halo_size   = [ n + 2 for n in extent ]
+halo_volume = 1
+for n in halo_size:
+    halo_volume *= n
+
+def halo_linear(coordinates):
+    strides = [ 1, halo_size[0], halo_size[0]*halo_size[1] ][:d]
+    return ' + '.join([ '(%s)*%d' % (x, stride) for x, stride in zip(coordinates, strides) ])
+
+state_size = d + 1 + descriptor.q
+
+axes = [ 'x', 'y', 'z' ][:d]
+%>
+
+<%def name="pull(memory, buffer, cell)">
+% for i, c_i in enumerate(descriptor.c):
+    const ${float_type} f_curr_${i} = ${memory.storage.load(buffer, pop_offset(memory, i, cell, neighbor_offset(memory, -c_i)))};
+% endfor
+</%def>
+
+<%def name="moments()">
+% for i, expr in enumerate(moments_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+% for i, expr in enumerate(moments_assignment):
+    const ${float_type} ${ccode(expr)}
+% endfor
+</%def>
+
+<%def name="equilibrium()">
+% for i, expr in enumerate(equilibrium_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+% for i, expr in enumerate(equilibrium_assignment):
+    const ${float_type} f_eq_${i} = ${ccode(expr)};
+% endfor
+</%def>
+
+<%def name="collide(subexpr, assignment)">
+% for i, expr in enumerate(subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+% for i, expr in enumerate(assignment):
+    const ${float_type} ${ccode(expr)}
+% endfor
+</%def>
+
+__kernel void collect_parent(__global ${parent.storage.type}* f,
+                             __global ${float_type}* state)
+{
+% for k, axis in enumerate(axes):
+    const unsigned int ${axis} = get_global_id(${k});
+% endfor
+
+    const unsigned int cell = ${halo_linear(axes)};
+    const unsigned int gid  = ${linear(parent, [ '%s + %d' % (axis, halo_origin[k]) for k, axis in enumerate(axes) ])};
+
+${pull(parent, 'f', 'gid')}
+${moments()}
+${equilibrium()}
+
+    state[cell] = rho;
+% for k in range(d):
+    state[${(1+k)*halo_volume} + cell] = u_${k};
+% endfor
+% for i in range(descriptor.q):
+    state[${(d+1+i)*halo_volume} + cell] = f_curr_${i} - f_eq_${i};
+% endfor
+}
+
+__kernel void prolongate(__global ${float_type}* state_prev,
+                         __global ${float_type}* state_next,
+                         __global ${child.storage.type}* f,
+                         ${float_type} alpha)
+{
+% for k, axis in enumerate(axes):
+    const unsigned int ${axis} = get_global_id(${k});
+% endfor
+
+    // only the outermost layer of parent cells is prescribed by the parent
+    if ( ${' && '.join([ '%s >= 2 && %s < %d' % (axis, axis, 2*extent[k]-2) for k, axis in enumerate(axes) ])} ) {
+        return;
+    }
+
+    const unsigned int gid = ${linear(child, axes)};
+
+% for k, axis in enumerate(axes):
+    const ${float_type} p_${k} = (${axis} + 0.5) / 2 + 0.5;
+    const unsigned int b_${k} = (unsigned int)floor(p_${k});
+    const ${float_type} w_${k} = p_${k} - b_${k};
+% endfor
+
+    const unsigned int base = ${halo_linear([ 'b_%d' % k for k in range(d) ])};
+
+    ${float_type} s[${state_size}];
+    for (unsigned int k = 0; k < ${state_size}; ++k) {
+        const unsigned int cell = k*${halo_volume} + base;
+        s[k] = 0.0;
+% for corner in product((0,1), repeat=d):
+        s[k] += ${'*'.join([ 'w_%d' % k if c else '(1-w_%d)' % k for k, c in enumerate(corner) ])} * ((1-alpha)*state_prev[cell + ${halo_linear([ str(c) for c in corner ])}] + alpha*state_next[cell + ${halo_linear([ str(c) for c in corner ])}]);
+% endfor
+    }
+
+    const ${float_type} rho = s[0];
+% for k in range(d):
+    const ${float_type} u_${k} = s[${1+k}];
+% endfor
+
+${equilibrium()}
+
+% for i in range(descriptor.q):
+    const ${float_type} f_curr_${i} = f_eq_${i} + ${scale_down} * s[${d+1+i}];
+% endfor
+
+${collide(child_collide[0], child_collide[1])}
+
+% for i in range(descriptor.q):
+    ${child.storage.store('f', pop_offset(child, i, 'gid'), 'f_next_%d' % i)};
+% endfor
+}
+
+__kernel void restrict_child(__global ${child.storage.type}* f_child,
+                             __global ${parent.storage.type}* f_parent)
+{
+% for k, axis in enumerate(axes):
+    const unsigned int ${axis} = get_global_id(${k}) + 1;
+% endfor
+
+    const unsigned int gid = ${linear(parent, [ '%s + %d' % (axis, origin[k]) for k, axis in enumerate(axes) ])};
+
+    ${float_type} rho_sum = 0.0;
+% for k in range(d):
+    ${float_type} j_sum_${k} = 0.0;
+% endfor
+% for i in range(descriptor.q):
+    ${float_type} f_neq_sum_${i} = 0.0;
+% endfor
+
+% for corner in product((0,1), repeat=d):
+    {
+        const unsigned int child_gid = ${linear(child, [ '2*%s + %d' % (axis, corner[k]) for k, axis in enumerate(axes) ])};
+${pull(child, 'f_child', 'child_gid')}
+${moments()}
+${equilibrium()}
+        rho_sum += rho;
+% for k in range(d):
+        j_sum_${k} += rho * u_${k};
+% endfor
+% for i in range(descriptor.q):
+        f_neq_sum_${i} += f_curr_${i} - f_eq_${i};
+% endfor
+    }
+% endfor
+
+    const ${float_type} rho = rho_sum / ${2**d};
+% for k in range(d):
+    const ${float_type} u_${k} = j_sum_${k} / rho_sum;
+% endfor
+
+${equilibrium()}
+
+% for i in range(descriptor.q):
+    const ${float_type} f_curr_${i} = f_eq_${i} + ${scale_up / 2**d} * f_neq_sum_${i};
+% endfor
+
+${collide(parent_collide[0], parent_collide[1])}
+
+% for i in range(descriptor.q):
+    ${parent.storage.store('f_parent', pop_offset(parent, i, 'gid'), 'f_next_%d' % i)};
+% endfor
+}
@@ -9,7 +9,7 @@ float2 v2(float x, float y) {
 	return (float2)(x,y);
 }
 
-__constant float3 center = (float3)(${geometry.size_x/2.5}, ${geometry.size_y/2}, ${geometry.size_z/2});
+__constant float3 center = (float3)(${scale*geometry.size_x/2.5}, ${scale*geometry.size_y/2}, ${scale*geometry.size_z/2});
 
 <%include file="sdf.lib.glsl.mako"/>
 
@@ -45,7 +45,11 @@ __kernel void setup_channel_with_sdf_obstacle(__global int* material) {
         return;
     }
 
+% if scale == 1:
     if (sdf((float3)(x,y,z)) < 0.0) {
+% else:
+    if (sdf(${scale}*((float3)(x,y,z) + 0.5f) - 0.5f) < 0.0) {
+% endif
         material[gid] = 2;
         return;
     }
@@ -0,0 +1,39 @@
+typedef float3 vec3;
+typedef float2 vec2;
+
+float3 v3(float x, float y, float z) {
+	return (float3)(x,y,z);
+}
+
+float2 v2(float x, float y) {
+	return (float2)(x,y);
+}
+
+__constant float3 center = (float3)(${domain_scale*domain.size_x/2.5}, ${domain_scale*domain.size_y/2}, ${domain_scale*domain.size_z/2});
+
+<%include file="sdf.lib.glsl.mako"/>
+
+${sdf_src}
+
+__kernel void setup_refinement_with_sdf_obstacle(__global int* material) {
+    const unsigned x = get_global_id(0);
+    const unsigned y = get_global_id(1);
+    const unsigned z = get_global_id(2);
+
+    const unsigned gid = z*${memory.size_x*memory.size_y} + y*${memory.size_x} + x;
+
+    // the outermost parent cell layer is prescribed by the parent lattice
+    if (x < 2 || x >= ${geometry.size_x-2} ||
+        y < 2 || y >= ${geometry.size_y-2} ||
+        z < 2 || z >= ${geometry.size_z-2}) {
+        material[gid] = 0;
+        return;
+    }
+
+    if (sdf(${scale}*((float3)(x + ${offset[0]}, y + ${offset[1]}, z + ${offset[2]}) + 0.5f) - 0.5f) < 0.0) {
+        material[gid] = 2;
+        return;
+    }
+
+    material[gid] = 1;
+}
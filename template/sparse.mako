@@ -0,0 +1,221 @@
+% if float_type == 'double':
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+#elif defined(cl_amd_fp64)
+#pragma OPENCL EXTENSION cl_amd_fp64 : enable
+#endif
+% endif
+
+<%
+d = descriptor.d
+axes = [ 'x', 'y', 'z' ][:d]
+
+block_volume = memory.block_volume
+directions   = 3**d
+
+def pop_offset(i, cell = 'cell'):
+    return memory.layout.offset(i, cell)
+
+def rest_population(i):
+    return '0.f' if shifted else '%s.f' % descriptor.w[i]
+
+strides = [ 1, memory.block[0], memory.block[0]*memory.block[1] ][:d]
+
+def local_index(coordinates):
+    return ' + '.join([ '%s*%d' % (x, stride) for x, stride in zip(coordinates, strides) ])
+
+def source(c_i):
+    # local cell and neighbor block direction that population c_i is pulled from
+    coordinates = []
+    direction   = [ str(directions // 2) ]
+    for k, axis in enumerate(axes):
+        if c_i[k] == 0:
+            coordinates.append('l%s' % axis)
+        elif c_i[k] > 0:
+            coordinates.append('%s_m' % axis)
+            direction.append('d%s_m*%d' % (axis, 3**k))
+        else:
+            coordinates.append('%s_p' % axis)
+            direction.append('d%s_p*%d' % (axis, 3**k))
+    return local_index(coordinates), ' + '.join(direction)
+
+def dense_gid():
+    return {
+        2: 'y*%d + x' % memory.size_x,
+        3: 'z*%d + y*%d + x' % (memory.size_x*memory.size_y, memory.size_x)
+    }.get(d)
+
+def moments_cell():
+    return {
+        2: '(int2)(x, y)',
+        3: '(int4)(x, y, z, 0)'
+    }.get(d)
+%>
+
+<%def name="block_coordinates()">
+    const unsigned int cell  = get_global_id(0);
+    const unsigned int block = cell / ${block_volume};
+% for k, axis in enumerate(axes):
+    const unsigned int l${axis} = cell % ${block_volume} / ${strides[k]} % ${memory.block[k]};
+% endfor
+</%def>
+
+<%def name="dense_coordinates()">
+% for k, axis in enumerate(axes):
+    const unsigned int ${axis} = origin[${d}*block + ${k}]*${memory.block[k]} + l${axis};
+% endfor
+</%def>
+
+<%def name="load_moments()">
+% for i in range(0,descriptor.q):
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f', pop_offset(i))};
+% endfor
+
+% for i, expr in enumerate(moments_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+</%def>
+
+__kernel void equilibrilize(__global ${memory.storage.type}* f_next,
+                            __global ${memory.storage.type}* f_prev)
+{
+    const unsigned int cell = get_global_id(0);
+
+% for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), rest_population(i))};
+    ${memory.storage.store('f_prev', pop_offset(i), rest_population(i))};
+% endfor
+}
+
+__kernel void collide_and_stream(__global ${memory.storage.type}* f_next,
+                                 __global ${memory.storage.type}* f_prev,
+                                 __global int* material,
+                                 __global int* neighbors,
+                                 unsigned int time)
+{
+${block_coordinates()}
+
+    const int m = material[cell];
+
+    if ( m == 0 ) {
+        return;
+    }
+
+% for k, axis in enumerate(axes):
+    const unsigned int ${axis}_m = l${axis} == 0 ? ${memory.block[k]-1} : l${axis} - 1;
+    const unsigned int ${axis}_p = l${axis} == ${memory.block[k]-1} ? 0 : l${axis} + 1;
+    const int d${axis}_m = l${axis} == 0 ? -1 : 0;
+    const int d${axis}_p = l${axis} == ${memory.block[k]-1} ? 1 : 0;
+% endfor
+
+% for i, c_i in enumerate(descriptor.c):
+%     if all([ c == 0 for c in c_i ]):
+    const ${float_type} f_curr_${i} = ${memory.storage.load('f_prev', pop_offset(i))};
+%     else:
+    // blocks that were not allocated only contain ghost cells at rest
+    const int n_${i} = neighbors[${directions}*block + ${source(c_i)[1]}];
+    const ${float_type} f_curr_${i} = n_${i} < 0 ? ${rest_population(i)} : ${memory.storage.load('f_prev', pop_offset(i, 'n_%d*%d + %s' % (i, block_volume, source(c_i)[0])))};
+%     endif
+% endfor
+
+% for i, expr in enumerate(moments_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+
+% for i, expr in enumerate(moments_assignment):
+    ${float_type} ${ccode(expr)}
+% endfor
+
+  ${boundary_src}
+
+% for i, expr in enumerate(collide_subexpr):
+    const ${float_type} ${expr[0]} = ${ccode(expr[1])};
+% endfor
+
+% for i, expr in enumerate(collide_assignment):
+    const ${float_type} ${ccode(expr)}
+% endfor
+
+% for i in range(0,descriptor.q):
+    ${memory.storage.store('f_next', pop_offset(i), 'f_next_%d' % i)};
+% endfor
+}
+
+__kernel void collect_moments(__global ${memory.storage.type}* f,
+                              __global unsigned int* origin,
+                              __global ${float_type}* moments)
+{
+${block_coordinates()}
+${dense_coordinates()}
+    const unsigned int gid = ${dense_gid()};
+
+${load_moments()}
+
+% for i, expr in enumerate(moments_assignment):
+    moments[${memory.moments_layout.offset(i, 'gid')}] = ${ccode(expr.rhs)};
+% endfor
+}
+
+% if opengl:
+__kernel void collect_gl_moments_and_materials_to_texture(__global ${memory.storage.type}* f,
+                                                          __global int* material,
+                                                          __global unsigned int* origin,
+% if descriptor.d == 2:
+                                                          __write_only image2d_t moments)
+% elif descriptor.d == 3:
+                                                          __write_only image3d_t moments)
+% endif
+{
+${block_coordinates()}
+${dense_coordinates()}
+
+${load_moments()}
+
+    float4 data;
+
+    if (material[cell] == 1) {
+      data.x = ${ccode(moments_assignment[0].rhs)};
+      data.y = ${ccode(moments_assignment[1].rhs)};
+      data.z = ${ccode(moments_assignment[2].rhs)};
+% if descriptor.d == 2:
+      data.w = sqrt(data.y*data.y + data.z*data.z);
+% elif descriptor.d == 3:
+      data.w = ${ccode(moments_assignment[3].rhs)};
+% endif
+    } else {
+      data.x = 0.0;
+      data.y = 0.0;
+      data.z = 0.0;
+      data.w = -material[cell];
+    }
+
+    write_imagef(moments, ${moments_cell()}, data);
+}
+
+__kernel void collect_gl_moments_to_texture(__global ${memory.storage.type}* f,
+                                            __global unsigned int* origin,
+% if descriptor.d == 2:
+                                            __write_only image2d_t moments)
+% elif descriptor.d == 3:
+                                            __write_only image3d_t moments)
+% endif
+{
+${block_coordinates()}
+${dense_coordinates()}
+
+${load_moments()}
+
+    float4 data;
+
+    data.x = ${ccode(moments_assignment[0].rhs)};
+    data.y = ${ccode(moments_assignment[1].rhs)};
+    data.z = ${ccode(moments_assignment[2].rhs)};
+% if descriptor.d == 2:
+    data.w = sqrt(data.y*data.y + data.z*data.z);
+% elif descriptor.d == 3:
+    data.w = ${ccode(moments_assignment[3].rhs)};
+% endif
+
+    write_imagef(moments, ${moments_cell()}, data);
+}
+% endif
@@ -44,8 +44,8 @@ __kernel void draw_streamline(__global float*  moments,
             break;
         }
 
-        particle.x += 0.5 * moments[${1*memory.volume}+gid] / 0.01;
-        particle.y += 0.5 * moments[${2*memory.volume}+gid] / 0.01;
+        particle.x += 0.5 * moments[${memory.moments_layout.offset(1, 'gid')}] / 0.01;
+        particle.y += 0.5 * moments[${memory.moments_layout.offset(2, 'gid')}] / 0.01;
 
         const int2 pos = (int2)(round(particle.x), round(particle.y));
 
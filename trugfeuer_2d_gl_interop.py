@@ -20,6 +20,9 @@ lattice_y = 320
 updates_per_frame = 40
 particle_count    = 100000
 
+# frames between spatial re-sorts of the particles, None to disable
+particle_sort_every = 25
+
 inflow = 0.006
 relaxation_time = 0.515
 
@@ -148,14 +151,13 @@ particles = Particles(
         lattice.geometry.size_y//20:2*lattice.geometry.size_y//20:100j,
     ].reshape(2,-1).T)
 
-def on_display():
-    for i in range(0,updates_per_frame):
-        lattice.evolve()
+if particle_sort_every != None:
+    lattice.schedule(particle_sort_every * updates_per_frame, lambda lattice: particles.sort())
 
-    lattice.update_moments()
+def on_display():
+    lattice.evolve(updates_per_frame)
 
-    for i in range(0,updates_per_frame):
-        particles.update(aging = True)
+    particles.update(aging = True, steps = updates_per_frame)
 
     lattice.sync()
 
@@ -0,0 +1,148 @@
+import pyopencl as cl
+import numpy
+
+import itertools
+import json
+import os
+import time
+
+from pathlib import Path
+
+from utility.cache import default_cache_path
+from symbolic.cache import codegen_cache
+
+def device_key(device):
+    return '%s %s %s' % (device.platform.name, device.name, device.driver_version)
+
+def work_group_sizes(d, max_size):
+    if d == 2:
+        candidates = itertools.chain(
+            [ (x, 1) for x in [ 16, 32, 64, 128, 256 ] ],
+            [ (x, y) for x in [ 8, 16, 32 ] for y in [ 2, 4, 8 ] ])
+    else:
+        candidates = itertools.chain(
+            [ (x, 1, 1) for x in [ 16, 32, 64, 128 ] ],
+            [ (x, y, 1) for x in [ 8, 16, 32 ] for y in [ 2, 4, 8 ] ],
+            [ (x, y, z) for x in [ 8, 16, 32 ] for y in [ 2, 4 ] for z in [ 2, 4 ] ])
+    return [ layout for layout in candidates if numpy.prod(layout) <= max_size ]
+
+def compiler_flags(precision):
+    if precision == 'double':
+        return [
+            '-cl-fast-relaxed-math',
+            '-cl-mad-enable',
+            ''
+        ]
+    else:
+        return [
+            '-cl-single-precision-constant -cl-fast-relaxed-math',
+            '-cl-single-precision-constant -cl-mad-enable',
+            '-cl-single-precision-constant'
+        ]
+
+class Autotuner:
+    def __init__(self, path = None, steps = 2e7):
+        self.path  = Path(path or default_cache_path())/'autotune.json'
+        self.steps = steps
+
+    def key(self, device, *problem):
+        return '%s %s' % (device_key(device), codegen_cache.key(*problem))
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def store(self, key, config):
+        configs = self.load()
+        configs[key] = config
+
+        try:
+            self.path.parent.mkdir(parents = True, exist_ok = True)
+            tmp = self.path.with_suffix('.tmp%d' % os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(configs, f, indent = 2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def measure(self, lattice):
+        cells = lattice.material.reshape(lattice.memory.size(), order='F')
+        cells[...] = 0
+        interior = numpy.ones(cells.shape, dtype = bool)
+        for x, n in zip(lattice.memory.coordinates(), lattice.geometry.size()):
+            interior &= (x > 0) & (x < n-1)
+        cells[interior] = 1
+        lattice.sync_material()
+
+        steps = max(10, int(self.steps / lattice.geometry.volume))
+
+        lattice.evolve(2)
+        lattice.sync()
+
+        start = time.time()
+        lattice.evolve(steps)
+        lattice.sync()
+
+        return lattice.geometry.volume * steps / (time.time() - start) * 1e-6
+
+    def candidate(self, factory, config):
+        try:
+            lattice = factory(**config)
+            mlups = self.measure(lattice)
+            del lattice
+            return mlups
+        except cl.Error:
+            return 0.0
+
+    def tune(self, factory, d, precision, max_work_group_size):
+        best = {
+            'layout':        None,
+            'padding':       None,
+            'align':         False,
+            'compiler_args': compiler_flags(precision)[0]
+        }
+        best_mlups = 0.0
+
+        # tune each parameter in turn starting from the work group shape
+        for layout in work_group_sizes(d, max_work_group_size):
+            config = dict(best, layout = layout, padding = layout)
+            mlups  = self.candidate(factory, config)
+            if mlups > best_mlups:
+                best, best_mlups = config, mlups
+
+        config = dict(best, align = True)
+        mlups  = self.candidate(factory, config)
+        if mlups > best_mlups:
+            best, best_mlups = config, mlups
+
+        for flags in compiler_flags(precision)[1:]:
+            config = dict(best, compiler_args = flags)
+            mlups  = self.candidate(factory, config)
+            if mlups > best_mlups:
+                best, best_mlups = config, mlups
+
+        best['mlups'] = best_mlups
+        return best
+
+    def get(self, device, problem, factory, d, precision):
+        key = self.key(device, *problem)
+
+        config = self.load().get(key, None)
+        if config == None:
+            config = self.tune(factory, d, precision, device.max_work_group_size)
+            self.store(key, config)
+
+        if config['layout'] == None:
+            raise RuntimeError('no work group size could be tuned for %s' % device.name)
+
+        return {
+            'layout':        tuple(config['layout']),
+            'padding':       tuple(config['padding']),
+            'align':         config['align'],
+            'compiler_args': config['compiler_args']
+        }
+
+autotuner = Autotuner()
@@ -0,0 +1,84 @@
+import pyopencl as cl
+mf = cl.mem_flags
+
+import numpy
+import time
+
+from mako.template import Template
+from pathlib import Path
+
+storage_bytes = {
+    'single':   4,
+    'double':   8,
+    'half':     2,
+    'bfloat16': 2
+}
+
+def bytes_per_update(q, precision):
+    return 2 * q * storage_bytes[precision] + numpy.int32(0).nbytes
+
+def max_mlups(bandwidth, bytes_per_update):
+    return bandwidth * 2**30 / bytes_per_update * 1e-6
+
+class BandwidthProbe:
+    def __init__(self, lattice):
+        if lattice.block != None:
+            raise ValueError('bandwidth probes require a dense lattice')
+
+        self.lattice = lattice
+        self.memory  = lattice.memory
+
+        program_src = Template(filename = str(Path(__file__).parent/'../template/bandwidth.mako')).render(
+            descriptor = self.lattice.descriptor,
+            memory     = self.memory,
+            float_type = self.lattice.float_type[1]
+        )
+        self.program = self.lattice.program_cache.build(self.lattice.context, program_src, self.lattice.compiler_args)
+
+        self.cl_pop = [ cl.Buffer(self.lattice.context, mf.READ_WRITE, size=self.memory.pop_size) for i in range(3) ]
+        for buf in self.cl_pop:
+            cl.enqueue_fill_buffer(self.lattice.queue, buf, numpy.uint8(0), 0, self.memory.pop_size)
+
+        # same ghost cell layer as the example geometries so that streaming stays in bounds
+        material = numpy.zeros(self.memory.size(), dtype=numpy.int32, order='F')
+        interior = numpy.ones(material.shape, dtype=bool)
+        for x, n in zip(self.memory.coordinates(), self.lattice.geometry.size()):
+            interior &= (x > 0) & (x < n-1)
+        material[interior] = 1
+
+        self.active = int(numpy.count_nonzero(material))
+        self.cl_material = cl.Buffer(self.lattice.context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=material.reshape(-1, order='F'))
+
+    def time(self, kernel, repetitions):
+        queue  = self.lattice.queue
+        size   = self.lattice.grid.size()
+        layout = self.lattice.layout
+
+        cl.enqueue_nd_range_kernel(queue, kernel, size, layout)
+        queue.finish()
+
+        # report the best of all repetitions as STREAM does
+        best = float('inf')
+        for i in range(repetitions):
+            start = time.time()
+            cl.enqueue_nd_range_kernel(queue, kernel, size, layout)
+            queue.finish()
+            best = min(best, time.time() - start)
+        return best
+
+    def measure(self, repetitions = 20):
+        copy = cl.Kernel(self.program, 'copy')
+        copy.set_args(self.cl_pop[0], self.cl_pop[1])
+        triad = cl.Kernel(self.program, 'triad')
+        triad.set_args(self.cl_pop[0], self.cl_pop[1], self.cl_pop[2], self.lattice.float_type[0](0.5))
+        stream = cl.Kernel(self.program, 'stream')
+        stream.set_args(self.cl_pop[0], self.cl_pop[1], self.cl_material)
+
+        populations = self.lattice.descriptor.q * self.memory.storage.dtype(0).nbytes
+        cells = self.lattice.grid.volume
+
+        return {
+            'copy':   2 * populations * cells / self.time(copy, repetitions) / 2**30,
+            'triad':  3 * populations * cells / self.time(triad, repetitions) / 2**30,
+            'stream': (2 * populations * self.active + numpy.int32(0).nbytes * cells) / self.time(stream, repetitions) / 2**30
+        }
@@ -0,0 +1,319 @@
+import numpy
+
+import ast
+import json
+import os
+import re
+import time
+
+from pathlib import Path
+from string import Template
+
+from simulation         import Lattice, Geometry
+from symbolic.generator import LBM
+from utility.bandwidth  import bytes_per_update
+
+import symbolic.D2Q9  as D2Q9
+import symbolic.D3Q19 as D3Q19
+import symbolic.D3Q27 as D3Q27
+
+def ldc_2d_material_map(g):
+    return [
+        (lambda x, y: (x > 0) & (x < g.size_x-1) & (y > 0) & (y < g.size_y-1),  1), # bulk fluid
+        (lambda x, y: (x == 1) | (y == 1) | (x == g.size_x-2),                   2), # left, right, bottom walls
+        (lambda x, y: y == g.size_y-2,                                           3), # lid
+        (lambda x, y: (x == 0) | (x == g.size_x-1) | (y == 0) | (y == g.size_y-1), 0)  # ghost cells
+    ]
+
+def ldc_3d_material_map(g):
+    return [
+        (lambda x, y, z: (x > 0) & (x < g.size_x-1) &
+                         (y > 0) & (y < g.size_y-1) &
+                         (z > 0) & (z < g.size_z-1),                                         1), # bulk fluid
+        (lambda x, y, z: (x == 1) | (y == 1) | (z == 1) | (x == g.size_x-2) | (y == g.size_y-2), 2), # walls
+        (lambda x, y, z: z == g.size_z-2,                                                    3), # lid
+        (lambda x, y, z: (x == 0) | (x == g.size_x-1) |
+                         (y == 0) | (y == g.size_y-1) |
+                         (z == 0) | (z == g.size_z-1),                                       0)  # ghost cells
+    ]
+
+def channel_2d_material_map(g):
+    return [
+        (lambda x, y: (x > 0) & (x < g.size_x-1) & (y > 0) & (y < g.size_y-1),  1), # bulk fluid
+        (lambda x, y: x == 1,                                                    3), # inflow
+        (lambda x, y: x == g.size_x-2,                                           4), # outflow
+        (lambda x, y: (y == 1) | (y == g.size_y-2),                              2), # walls
+        (lambda x, y: (x - g.size_x//4)**2 + (y - g.size_y//2)**2 < (g.size_y//8)**2, 2), # obstacle
+        (lambda x, y: (x == 0) | (x == g.size_x-1) | (y == 0) | (y == g.size_y-1), 0)  # ghost cells
+    ]
+
+def channel_3d_material_map(g):
+    return [
+        (lambda x, y, z: (x > 0) & (x < g.size_x-1) &
+                         (y > 0) & (y < g.size_y-1) &
+                         (z > 0) & (z < g.size_z-1),                                 1), # bulk fluid
+        (lambda x, y, z: x == 1,                                                     3), # inflow
+        (lambda x, y, z: x == g.size_x-2,                                            4), # outflow
+        (lambda x, y, z: (y == 1) | (y == g.size_y-2) | (z == 1) | (z == g.size_z-2), 2), # walls
+        (lambda x, y, z: (x - g.size_x//4)**2 + (y - g.size_y//2)**2 + (z - g.size_z//2)**2 < (g.size_y//8)**2, 2), # obstacle
+        (lambda x, y, z: (x == 0) | (x == g.size_x-1) |
+                         (y == 0) | (y == g.size_y-1) |
+                         (z == 0) | (z == g.size_z-1),                               0)  # ghost cells
+    ]
+
+boundary = {
+    2: Template("""
+    if ( m == 2 ) {
+        u_0 = 0.0;
+        u_1 = 0.0;
+    }
+    if ( m == 3 ) {
+        u_0 = $speed;
+        u_1 = 0.0;
+    }
+    if ( m == 4 ) {
+        rho = 1.0;
+    }
+"""),
+    3: Template("""
+    if ( m == 2 ) {
+        u_0 = 0.0;
+        u_1 = 0.0;
+        u_2 = 0.0;
+    }
+    if ( m == 3 ) {
+        u_0 = $speed;
+        u_1 = 0.0;
+        u_2 = 0.0;
+    }
+    if ( m == 4 ) {
+        rho = 1.0;
+    }
+""")
+}
+
+scenarios = {
+    'ldc_2d': {
+        'descriptors':  [ D2Q9 ],
+        'size':         (256, 256),
+        'layout':       (32, 1),
+        'material_map': ldc_2d_material_map,
+        'speed':        0.1
+    },
+    'ldc_3d': {
+        'descriptors':  [ D3Q19, D3Q27 ],
+        'size':         (64, 64, 64),
+        'layout':       (32, 1, 1),
+        'material_map': ldc_3d_material_map,
+        'speed':        0.05
+    },
+    'channel_2d': {
+        'descriptors':  [ D2Q9 ],
+        'size':         (512, 256),
+        'layout':       (32, 1),
+        'material_map': channel_2d_material_map,
+        'speed':        0.05
+    },
+    'channel_3d': {
+        'descriptors':  [ D3Q19, D3Q27 ],
+        'size':         (128, 64, 64),
+        'layout':       (32, 1, 1),
+        'material_map': channel_3d_material_map,
+        'speed':        0.05
+    }
+}
+
+precisions = [ 'single', 'double', 'half', 'bfloat16' ]
+
+relaxation_time = 0.52
+
+collisions = {
+    'bgk':         lambda lbm, optimize: lbm.bgk(f_eq = lbm.equilibrium(), tau = relaxation_time, optimize = optimize),
+    'trt':         lambda lbm, optimize: lbm.trt(f_eq = lbm.equilibrium(), tau = relaxation_time, optimize = optimize),
+    'mrt':         lambda lbm, optimize: lbm.mrt(f_eq = lbm.equilibrium(), tau = relaxation_time, optimize = optimize),
+    'smagorinsky': lambda lbm, optimize: lbm.bgk_smagorinsky(f_eq = lbm.equilibrium(), tau = relaxation_time, c_smago = 0.1, optimize = optimize)
+}
+
+def record_key(record):
+    return (
+        record['scenario'],
+        record['descriptor'],
+        record['precision'],
+        tuple(record['size']),
+        tuple(record['layout']) if record['layout'] != None else None,
+        record['optimize'],
+        record['align'],
+        record['streaming'],
+        record['population_layout'],
+        record.get('collision', 'bgk')
+    )
+
+def summarize(record, samples, bytes_per_update, bandwidth = None):
+    record['samples']          = samples
+    record['mlups']            = float(numpy.mean(samples))
+    record['variance']         = float(numpy.var(samples))
+    record['stdev']            = float(numpy.std(samples))
+    record['bytes_per_update'] = bytes_per_update
+    record['bandwidth']        = record['mlups'] * 1e6 * bytes_per_update / 2**30
+
+    if bandwidth != None:
+        record['roofline'] = 100 * record['bandwidth'] / bandwidth
+    else:
+        record['roofline'] = None
+
+    return record
+
+def run_scenario(name, descriptor, precision, samples = 5, steps = 100, size = None, layout = None,
+                 optimize = True, align = True, streaming = 'AB', collision = 'bgk', bandwidth = None, **lattice_args):
+    scenario = scenarios[name]
+
+    size   = size   or scenario['size']
+    layout = layout or scenario['layout']
+
+    lbm = LBM(descriptor)
+
+    lattice = Lattice(
+        descriptor = descriptor,
+        geometry   = Geometry(*size),
+        precision  = precision,
+        layout     = layout,
+        padding    = layout,
+        align      = align,
+        streaming  = streaming,
+        moments = lbm.moments(optimize = optimize),
+        collide = collisions[collision](lbm, optimize),
+        boundary_src = boundary[descriptor.d].substitute({
+            'speed': scenario['speed']
+        }),
+        **lattice_args)
+
+    lattice.material[:] = 0
+    lattice.apply_vectorized_material_map(
+        scenario['material_map'](lattice.geometry))
+    lattice.sync_material()
+
+    lattice.evolve(steps)
+    lattice.sync()
+
+    stats = []
+
+    for i in range(samples):
+        start = time.time()
+        lattice.evolve(steps)
+        lattice.sync()
+        stats.append(lattice.geometry.volume * steps / (time.time() - start) * 1e-6)
+
+    record = {
+        'scenario':          name,
+        'descriptor':        descriptor.__name__,
+        'precision':         precision,
+        'size':              list(size),
+        'layout':            list(lattice.layout),
+        'optimize':          optimize,
+        'align':             align,
+        'streaming':         streaming,
+        'population_layout': lattice.memory.layout.name,
+        'collision':         collision,
+        'bytes_moved':       lattice.memory.bytes_per_update() * lattice.geometry.volume * steps * samples
+    }
+
+    if bandwidth == None:
+        bandwidth = lattice.attainable_bandwidth()
+
+    return summarize(record, stats, lattice.memory.bytes_per_update(), bandwidth)
+
+def import_legacy(path):
+    path = Path(path)
+
+    # e.g. result/ldc_3d_benchmark_P100.log or result/ldc_2d_benchmark_K2200.py
+    scenario, device = re.match(r'(\w+_\dd)_benchmark_(\w+)', path.stem).groups()
+
+    if path.suffix == '.py':
+        measurements = ast.literal_eval(path.read_text().split('=', 1)[1].strip())
+    else:
+        measurements = [
+            (ast.literal_eval(config), [ int(mlups) ])
+                for config, mlups in re.findall(r'^(\(.*\)): ~(\d+) MLUPS$', path.read_text(), re.MULTILINE)
+        ]
+
+    results = []
+
+    for config, samples in measurements:
+        if scenario == 'ldc_2d':
+            size, layout, precision, optimize, align = config
+            descriptor = 'symbolic.D2Q9'
+            size = (size, size)
+        else:
+            size, layout, descriptor, precision, optimize, align = config
+            size = (size, size, size)
+
+        record = {
+            'scenario':          scenario,
+            'descriptor':        descriptor,
+            'precision':         precision,
+            'size':              list(size),
+            'layout':            list(layout),
+            'optimize':          optimize,
+            'align':             align,
+            'streaming':         'AB',
+            'population_layout': 'SoA',
+            'collision':         'bgk',
+            'bytes_moved':       None
+        }
+        results.append(summarize(record, samples, bytes_per_update({
+            'symbolic.D2Q9':  9,
+            'symbolic.D3Q19': 19,
+            'symbolic.D3Q27': 27
+        }.get(descriptor), precision)))
+
+    return {
+        'device':  device,
+        'time':    None,
+        'source':  str(path),
+        'results': results
+    }
+
+def load_results(path):
+    if Path(path).suffix == '.json':
+        with open(path) as f:
+            return json.load(f)
+    else:
+        return import_legacy(path)
+
+def store_results(path, results):
+    path = Path(path)
+    path.parent.mkdir(parents = True, exist_ok = True)
+    tmp = path.with_suffix('.tmp%d' % os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(results, f, indent = 2)
+    os.replace(tmp, path)
+
+def collision_costs(results):
+    # time per cell update of every collision operator relative to BGK of the same configuration
+    bgk = { record_key(record)[:-1]: record for record in results['results'] if record.get('collision', 'bgk') == 'bgk' }
+
+    costs = []
+
+    for record in results['results']:
+        base = bgk.get(record_key(record)[:-1], None)
+        if base == None or record is base:
+            continue
+        costs.append((record, base, base['mlups'] / record['mlups']))
+
+    return costs
+
+def compare(current, baseline, threshold = 0.05):
+    reference = { record_key(record): record for record in baseline['results'] }
+
+    regressions = []
+
+    for record in current['results']:
+        base = reference.get(record_key(record), None)
+        if base == None:
+            continue
+
+        change = record['mlups'] / base['mlups'] - 1
+        if change < -threshold:
+            regressions.append((record, base, change))
+
+    return regressions
@@ -0,0 +1,103 @@
+import pyopencl as cl
+
+import hashlib
+import os
+
+from pathlib import Path
+
+def default_cache_path():
+    return Path(os.environ.get('LBM_CACHE_DIR', Path.home()/'.cache'/'opencl_playground'))
+
+class ProgramCache:
+    def __init__(self, path = None, max_size = 256*2**20):
+        self.path = Path(path or default_cache_path())/'program'
+        self.max_size = max_size
+
+        self.hits   = 0
+        self.misses = 0
+
+    def key(self, context, src, options):
+        digest = hashlib.sha256()
+        digest.update(src.encode())
+        digest.update(str(options).encode())
+        for device in context.devices:
+            for info in [ device.platform.name, device.platform.version, device.name, device.version, device.driver_version ]:
+                digest.update(info.encode())
+        return digest.hexdigest()
+
+    def entries(self):
+        return list(self.path.glob('*.bin'))
+
+    def groups(self):
+        # all per-device binaries of a program share the key prefix and are only usable together
+        groups = {}
+        for entry in self.entries():
+            groups.setdefault(entry.name.split('.')[0], []).append(entry)
+        return list(groups.values())
+
+    def size(self):
+        return sum(map(lambda entry: entry.stat().st_size, self.entries()))
+
+    def stats(self):
+        return {
+            'hits':    self.hits,
+            'misses':  self.misses,
+            'entries': len(self.groups()),
+            'size':    self.size()
+        }
+
+    def load(self, context, key, options):
+        paths = [ self.path/('%s.%d.bin' % (key, i)) for i in range(len(context.devices)) ]
+        if not all(map(lambda path: path.exists(), paths)):
+            return None
+
+        try:
+            program = cl.Program(context, context.devices, [ path.read_bytes() for path in paths ]).build(options)
+        except (cl.Error, OSError):
+            return None
+
+        for path in paths:
+            os.utime(path)
+
+        return program
+
+    def store(self, key, program):
+        self.path.mkdir(parents = True, exist_ok = True)
+        for i, binary in enumerate(program.get_info(cl.program_info.BINARIES)):
+            path = self.path/('%s.%d.bin' % (key, i))
+            tmp  = path.with_suffix('.tmp%d' % os.getpid())
+            tmp.write_bytes(binary)
+            os.replace(tmp, path)
+
+    def evict(self):
+        groups = sorted(self.groups(), key = lambda group: max(map(lambda entry: entry.stat().st_mtime, group)))
+        size = sum(map(lambda group: sum(map(lambda entry: entry.stat().st_size, group)), groups))
+        while size > self.max_size and len(groups) > 0:
+            for entry in groups.pop(0):
+                size -= entry.stat().st_size
+                entry.unlink()
+
+    def clear(self):
+        for entry in self.entries():
+            entry.unlink()
+
+    def build(self, context, src, options = ''):
+        key = self.key(context, src, options)
+
+        program = self.load(context, key, options)
+        if program is not None:
+            self.hits += 1
+            return program
+
+        self.misses += 1
+        program = cl.Program(context, src).build(options)
+
+        try:
+            self.store(key, program)
+            self.evict()
+        except OSError:
+            pass
+
+        return program
+
+program_cache = ProgramCache()
@@ -0,0 +1,58 @@
+import numpy
+
+import json
+import os
+import threading
+
+from pathlib import Path
+
+class CheckpointWriter(threading.Thread):
+    def __init__(self, path, header, arrays, events):
+        # not a daemon so that the interpreter finishes a checkpoint in flight before exiting
+        super().__init__()
+        self.path   = Path(path)
+        self.header = header
+        self.arrays = arrays
+        self.events = events
+        self.error  = None
+
+    def run(self):
+        try:
+            self.write()
+        except Exception as e:
+            self.error = e
+
+    def write(self):
+        self.path.mkdir(parents = True, exist_ok = True)
+
+        for event in self.events:
+            event.wait()
+
+        # an existing checkpoint becomes unreadable before any of its arrays are overwritten
+        (self.path/'header.json').unlink(missing_ok = True)
+
+        for name, array in self.arrays.items():
+            array.tofile(self.path/('%s.raw' % name))
+
+        self.header['arrays'] = {
+            name: { 'shape': list(array.shape), 'dtype': array.dtype.str } for name, array in self.arrays.items()
+        }
+
+        # the header is written last so that only complete checkpoints are readable
+        tmp = self.path/'header.json.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.header, f)
+        os.replace(tmp, self.path/'header.json')
+
+def read_checkpoint(path):
+    path = Path(path)
+
+    with open(path/'header.json') as f:
+        header = json.load(f)
+
+    arrays = {
+        name: numpy.memmap(path/('%s.raw' % name), dtype = numpy.dtype(info['dtype']), mode = 'r', shape = tuple(info['shape']))
+            for name, info in header['arrays'].items()
+    }
+
+    return header, arrays
@@ -17,6 +17,9 @@ class MomentsTexture:
         self.gl_texture_buffer = numpy.ndarray(shape=(self.lattice.memory.volume, 4), dtype=self.lattice.memory.float_type)
         self.gl_texture_buffer[:,:] = 0.0
 
+        # populations read and RGBA texels written per collection
+        self.texture_bytes = (self.lattice.descriptor.q * self.lattice.memory.storage.dtype(0).nbytes + 4 * self.lattice.memory.float_type(0).nbytes) * self.lattice.grid.volume
+
         self.gl_moments = glGenTextures(1)
         self.gl_texture_type = {2: GL_TEXTURE_2D, 3: GL_TEXTURE_3D}.get(self.lattice.descriptor.d)
         glBindTexture(self.gl_texture_type, self.gl_moments)
@@ -37,7 +40,9 @@ class MomentsTexture:
             glTexParameteri(self.gl_texture_type, GL_TEXTURE_WRAP_S,     GL_CLAMP_TO_EDGE)
             self.cl_gl_moments  = cl.GLTexture(self.lattice.context, mf.READ_WRITE, self.gl_texture_type, 0, self.gl_moments, 2)
 
-        self.build_kernel()
+        # sparse lattices scatter their blocks into the texture using their own program
+        if self.lattice.block == None:
+            self.build_kernel()
 
     def build_kernel(self):
         program_src = Template(filename = str(Path(__file__).parent/'../template/opengl.mako')).render(
@@ -51,37 +56,56 @@ class MomentsTexture:
             collide_assignment = self.lattice.collide[1],
 
             float_type = self.lattice.float_type[1],
+            shifted    = self.lattice.shifted,
 
             ccode = sympy.ccode
         )
-        self.program = cl.Program(self.lattice.context, program_src).build(self.lattice.compiler_args)
+        self.program = self.lattice.program_cache.build(self.lattice.context, program_src, self.lattice.compiler_args)
 
     def bind(self, location = GL_TEXTURE0):
         glEnable(self.gl_texture_type)
         glActiveTexture(location);
         glBindTexture(self.gl_texture_type, self.gl_moments)
 
-    def collect_moments_from_pop_to_texture(self, population):
-        if self.include_materials:
-            self.program.collect_gl_moments_and_materials_to_texture(
+    def collect_moments_from_pop_to_texture(self, population, swapped = False):
+        if self.lattice.block != None:
+            texture_bytes = self.texture_bytes * self.lattice.memory.sparse_volume // self.lattice.grid.volume
+            if self.include_materials:
+                self.lattice.stats.record('collect_gl_moments_and_materials_to_texture', self.lattice.program.collect_gl_moments_and_materials_to_texture(
+                    self.lattice.queue,
+                    self.lattice.work_size(),
+                    self.lattice.layout,
+                    population,
+                    self.lattice.memory.cl_block_material,
+                    self.lattice.memory.cl_block_origin,
+                    self.cl_gl_moments), texture_bytes + self.lattice.memory.block_material.nbytes)
+            else:
+                self.lattice.stats.record('collect_gl_moments_to_texture', self.lattice.program.collect_gl_moments_to_texture(
+                    self.lattice.queue,
+                    self.lattice.work_size(),
+                    self.lattice.layout,
+                    population,
+                    self.lattice.memory.cl_block_origin,
+                    self.cl_gl_moments), texture_bytes)
+        elif self.include_materials:
+            kernel = self.program.collect_gl_moments_and_materials_to_texture_swapped if swapped else self.program.collect_gl_moments_and_materials_to_texture
+            self.lattice.stats.record('collect_gl_moments_and_materials_to_texture', kernel(
                 self.lattice.queue,
                 self.lattice.grid.size(),
                 self.lattice.layout,
                 population,
                 self.lattice.memory.cl_material,
-                self.cl_gl_moments)
+                self.cl_gl_moments), self.texture_bytes + self.lattice.material.nbytes)
         else:
-            self.program.collect_gl_moments_to_texture(
+            kernel = self.program.collect_gl_moments_to_texture_swapped if swapped else self.program.collect_gl_moments_to_texture
+            self.lattice.stats.record('collect_gl_moments_to_texture', kernel(
                 self.lattice.queue,
                 self.lattice.grid.size(),
                 self.lattice.layout,
                 population,
-                self.cl_gl_moments)
+                self.cl_gl_moments), self.texture_bytes)
 
     def collect(self):
         cl.enqueue_acquire_gl_objects(self.lattice.queue, [self.cl_gl_moments])
 
-        if self.lattice.tick:
-            self.collect_moments_from_pop_to_texture(self.lattice.memory.cl_pop_b)
-        else:
-            self.collect_moments_from_pop_to_texture(self.lattice.memory.cl_pop_a)
+        self.collect_moments_from_pop_to_texture(self.lattice.population(), self.lattice.swapped())
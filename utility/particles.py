@@ -2,6 +2,7 @@ import pyopencl as cl
 mf = cl.mem_flags
 
 import numpy
+import sympy
 
 from mako.template import Template
 from pathlib import Path
@@ -10,7 +11,10 @@ import OpenGL.GL as gl
 from OpenGL.arrays import vbo
 
 class Particles:
-    def __init__(self, lattice, grid):
+    def __init__(self, lattice, grid, chunk_size = 256):
+        if lattice.block != None:
+            raise ValueError('particles require a dense lattice')
+
         self.lattice = lattice
         self.context = self.lattice.context
         self.queue   = self.lattice.queue
@@ -30,40 +34,140 @@ class Particles:
             self.np_particles[:,3]   = numpy.random.sample(self.count)
             self.np_init_particles = self.np_particles
 
-        self.gl_particles = vbo.VBO(data=self.np_particles, usage=gl.GL_DYNAMIC_DRAW, target=gl.GL_ARRAY_BUFFER)
-        self.gl_particles.bind()
-        self.cl_gl_particles = cl.GLBuffer(self.context, mf.READ_WRITE, int(self.gl_particles))
+        # particles are shared with OpenGL for rendering if the lattice supports it
+        if self.lattice.opengl:
+            self.gl_particles = vbo.VBO(data=self.np_particles, usage=gl.GL_DYNAMIC_DRAW, target=gl.GL_ARRAY_BUFFER)
+            self.gl_particles.bind()
+            self.cl_particles = cl.GLBuffer(self.context, mf.READ_WRITE, int(self.gl_particles))
+        else:
+            self.cl_particles = cl.Buffer(self.context, mf.READ_WRITE, size=self.count * 4*numpy.float32(0).nbytes)
+            cl.enqueue_copy(self.queue, self.cl_particles, self.np_particles).wait();
 
-        self.cl_init_particles = cl.Buffer(self.context, mf.READ_ONLY, size=self.count * 4*numpy.float32(0).nbytes)
+        self.cl_init_particles = cl.Buffer(self.context, mf.READ_WRITE, size=self.count * 4*numpy.float32(0).nbytes)
         cl.enqueue_copy(self.queue, self.cl_init_particles, self.np_init_particles).wait();
 
         self.build_kernel()
+        self.build_sort_kernel(chunk_size)
 
     def build_kernel(self):
         program_src = Template(filename = str(Path(__file__).parent/'../template/particles.mako')).render(
             descriptor = self.lattice.descriptor,
             geometry   = self.lattice.geometry,
             memory     = self.lattice.memory,
-            float_type = self.float_type,
+
+            moments_subexpr    = self.lattice.moments[0],
+            moments_assignment = self.lattice.moments[1],
+
+            float_type = self.lattice.float_type[1],
+            shifted    = self.lattice.shifted,
+
+            ccode = sympy.ccode
         )
-        self.program = cl.Program(self.lattice.context, program_src).build(self.lattice.compiler_args)
+        self.program = self.lattice.program_cache.build(self.lattice.context, program_src, self.lattice.compiler_args)
+
+        self.update_particles = cl.Kernel(self.program, 'update_particles')
+        if self.lattice.memory.streaming == 'AA':
+            self.update_particles_swapped = cl.Kernel(self.program, 'update_particles_swapped')
+
+        # each sub-step interpolates the velocity at two positions from the populations of 2^d cells
+        self.update_bytes = 2 * 2**self.lattice.descriptor.d * (
+            self.lattice.descriptor.q * self.lattice.memory.storage.dtype(0).nbytes + numpy.int32(0).nbytes)
+
+    def build_sort_kernel(self, chunk_size, radix_bits = 4):
+        size = self.lattice.memory.size()
+        key_bits = len(size) * max([ int(n - 1).bit_length() for n in size ])
+
+        self.chunks = (self.count + chunk_size - 1) // chunk_size
+        self.sort_passes = (key_bits + radix_bits - 1) // radix_bits
+        self.radix_bits  = radix_bits
+        self.scan_size   = min(256, self.queue.device.max_work_group_size)
+
+        program_src = Template(filename = str(Path(__file__).parent/'../template/particle_sort.mako')).render(
+            descriptor = self.lattice.descriptor,
+            memory     = self.lattice.memory,
+            count      = self.count,
+            chunks     = self.chunks,
+            chunk_size = chunk_size,
+            key_bits   = key_bits,
+            radix_bits = radix_bits
+        )
+        self.sort_program = self.lattice.program_cache.build(self.lattice.context, program_src, self.lattice.compiler_args)
+
+        self.morton_keys       = cl.Kernel(self.sort_program, 'morton_keys')
+        self.radix_histogram   = cl.Kernel(self.sort_program, 'radix_histogram')
+        self.radix_scan        = cl.Kernel(self.sort_program, 'radix_scan')
+        self.radix_scatter     = cl.Kernel(self.sort_program, 'radix_scatter')
+        self.permute_particles = cl.Kernel(self.sort_program, 'permute_particles')
+
+        self.cl_keys      = [ cl.Buffer(self.context, mf.READ_WRITE, size=self.count * numpy.uint32(0).nbytes) for i in range(2) ]
+        self.cl_indices   = [ cl.Buffer(self.context, mf.READ_WRITE, size=self.count * numpy.uint32(0).nbytes) for i in range(2) ]
+        self.cl_histogram = cl.Buffer(self.context, mf.READ_WRITE, size=2**radix_bits * self.chunks * numpy.uint32(0).nbytes)
+
+        self.cl_sorted_particles      = cl.Buffer(self.context, mf.READ_WRITE, size=self.count * 4*numpy.float32(0).nbytes)
+        self.cl_sorted_init_particles = cl.Buffer(self.context, mf.READ_WRITE, size=self.count * 4*numpy.float32(0).nbytes)
+
+    def acquire(self):
+        if self.lattice.opengl:
+            cl.enqueue_acquire_gl_objects(self.queue, [self.cl_particles])
+
+    def sort(self):
+        # reorder particles along a Z-order curve of their cells so that neighboring work items sample nearby cells
+        self.acquire()
+
+        key_bytes      = self.count * numpy.uint32(0).nbytes
+        particle_bytes = self.count * 4*numpy.float32(0).nbytes
+        histogram_size = 2**self.radix_bits * self.chunks
+
+        self.morton_keys.set_args(self.cl_particles, self.cl_keys[0], self.cl_indices[0])
+        self.lattice.stats.record('morton_keys', cl.enqueue_nd_range_kernel(
+            self.queue, self.morton_keys, (self.count,), None), particle_bytes + 2 * key_bytes)
+
+        for i in range(self.sort_passes):
+            shift = numpy.uint32(i * self.radix_bits)
+
+            self.radix_histogram.set_args(self.cl_keys[0], self.cl_histogram, shift)
+            self.lattice.stats.record('radix_histogram', cl.enqueue_nd_range_kernel(
+                self.queue, self.radix_histogram, (self.chunks,), None), key_bytes + histogram_size * numpy.uint32(0).nbytes)
+
+            self.radix_scan.set_args(self.cl_histogram, cl.LocalMemory(self.scan_size * numpy.uint32(0).nbytes))
+            self.lattice.stats.record('radix_scan', cl.enqueue_nd_range_kernel(
+                self.queue, self.radix_scan, (self.scan_size,), (self.scan_size,)), 3 * histogram_size * numpy.uint32(0).nbytes)
+
+            self.radix_scatter.set_args(self.cl_keys[0], self.cl_indices[0], self.cl_keys[1], self.cl_indices[1], self.cl_histogram, shift)
+            self.lattice.stats.record('radix_scatter', cl.enqueue_nd_range_kernel(
+                self.queue, self.radix_scatter, (self.chunks,), None), 4 * key_bytes + histogram_size * numpy.uint32(0).nbytes)
+
+            self.cl_keys.reverse()
+            self.cl_indices.reverse()
+
+        self.permute_particles.set_args(self.cl_particles, self.cl_init_particles, self.cl_sorted_particles, self.cl_sorted_init_particles, self.cl_indices[0])
+        self.lattice.stats.record('permute_particles', cl.enqueue_nd_range_kernel(
+            self.queue, self.permute_particles, (self.count,), None), 4 * particle_bytes + key_bytes)
+
+        # the shared vertex buffer keeps its identity while the initial positions are swapped
+        self.lattice.stats.record('copy_particles', cl.enqueue_copy(
+            self.queue, self.cl_particles, self.cl_sorted_particles), 2 * particle_bytes)
+        self.cl_init_particles, self.cl_sorted_init_particles = self.cl_sorted_init_particles, self.cl_init_particles
 
     def bind(self):
         gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
         self.gl_particles.bind()
         gl.glVertexPointer(4, gl.GL_FLOAT, 0, self.gl_particles)
 
-    def update(self, aging = False):
-        cl.enqueue_acquire_gl_objects(self.queue, [self.cl_gl_particles])
+    def update(self, aging = False, steps = 1):
+        self.acquire()
 
         if aging:
             age = numpy.float32(0.000006)
         else:
             age = numpy.float32(0.0)
 
-        self.program.update_particles(
-            self.queue, (self.count,1), None,
-            self.lattice.memory.cl_moments,
+        kernel = self.update_particles_swapped if self.lattice.swapped() else self.update_particles
+        kernel.set_args(
+            self.lattice.population(),
             self.lattice.memory.cl_material,
-            self.cl_gl_particles, self.cl_init_particles,
-            age)
+            self.cl_particles, self.cl_init_particles,
+            age, numpy.uint32(steps))
+
+        self.lattice.stats.record('update_particles', cl.enqueue_nd_range_kernel(
+            self.queue, kernel, (self.count,), None), self.count * (steps * self.update_bytes + 2 * 4*numpy.float32(0).nbytes))
@@ -0,0 +1,25 @@
+import numpy
+
+from multiprocessing import Pool
+
+def moments_view(lattice, moments):
+    view = moments.reshape((lattice.descriptor.d+1,) + tuple(reversed(lattice.memory.size())))
+    return view[(slice(None),) + tuple(slice(0, n) for n in reversed(lattice.geometry.size()))]
+
+def inner_moments_view(lattice, moments):
+    view = moments_view(lattice, moments)
+    return view[(slice(None),) + (slice(1, -1),) * lattice.descriptor.d]
+
+def density(view):
+    return view[0]
+
+def velocity(view):
+    return view[1:]
+
+def velocity_norm(view):
+    return numpy.sqrt(numpy.sum(velocity(view)**2, axis = 0))
+
+def render_frames(render, frames, processes = None):
+    with Pool(processes) as pool:
+        for i in pool.imap(render, enumerate(frames)):
+            print("Generated plot %d." % (i+1))
@@ -0,0 +1,61 @@
+import pyopencl as cl
+import numpy
+
+from collections import deque
+
+class Profiler:
+    def __init__(self, enabled = False, window = 1000):
+        self.enabled = enabled
+        self.window  = window
+        self.pending = deque()
+        self.samples = {}
+
+    def queue_properties(self):
+        if self.enabled:
+            return cl.command_queue_properties.PROFILING_ENABLE
+        else:
+            return 0
+
+    def record(self, name, event, nbytes = 0):
+        if self.enabled:
+            self.pending.append((name, event, nbytes))
+            # events older than the window are all but certain to be complete
+            while len(self.pending) > self.window:
+                self.collect_oldest()
+        return event
+
+    def collect_oldest(self):
+        name, event, nbytes = self.pending.popleft()
+        event.wait()
+        duration = (event.profile.end - event.profile.start) * 1e-9
+        self.samples.setdefault(name, deque(maxlen = self.window)).append((duration, nbytes))
+
+    def collect(self):
+        while len(self.pending) > 0:
+            self.collect_oldest()
+
+    def reset(self):
+        self.collect()
+        self.samples = {}
+
+    def summary(self):
+        self.collect()
+
+        stats = {}
+        for name, samples in self.samples.items():
+            durations = numpy.array([ duration for duration, nbytes in samples ])
+            nbytes    = sum([ nbytes for duration, nbytes in samples ])
+            stats[name] = {
+                'count':     len(durations),
+                'total':     float(numpy.sum(durations)),
+                'mean':      float(numpy.mean(durations)),
+                'p50':       float(numpy.percentile(durations, 50)),
+                'p99':       float(numpy.percentile(durations, 99)),
+                'bandwidth': nbytes / numpy.sum(durations) / 2**30 if numpy.sum(durations) > 0 else 0.0
+            }
+        return stats
+
+    def report(self):
+        for name, stats in sorted(self.summary().items(), key = lambda item: -item[1]['total']):
+            print('%-40s %6d calls, mean %8.3f ms, p50 %8.3f ms, p99 %8.3f ms, %6.1f GiB/s' % (
+                name, stats['count'], 1e3 * stats['mean'], 1e3 * stats['p50'], 1e3 * stats['p99'], stats['bandwidth']))
@@ -0,0 +1,196 @@
+import pyopencl as cl
+mf = cl.mem_flags
+
+import numpy
+import sympy
+
+from collections import deque
+from mako.template import Template
+from pathlib import Path
+
+class Reduction:
+    def __init__(self, lattice, group_size = 256):
+        if lattice.block != None:
+            raise ValueError('reductions require a dense lattice')
+
+        self.lattice = lattice
+        self.memory  = lattice.memory
+
+        device = lattice.platform.get_devices()[0]
+
+        # the tree reductions halve the work group each step and need a power of two size
+        self.group_size = 1 << (min(group_size, device.max_work_group_size).bit_length() - 1)
+
+        while True:
+            self.groups  = (self.memory.volume + self.group_size - 1) // self.group_size
+            self.program = self.build()
+
+            # kernels may support less than the device maximum e.g. due to their register or local memory usage
+            limit = min([ kernel.get_work_group_info(cl.kernel_work_group_info.WORK_GROUP_SIZE, device)
+                          for kernel in self.program.all_kernels() ])
+            if self.group_size <= limit:
+                break
+            self.group_size = 1 << (limit.bit_length() - 1)
+
+        self.reduce_bytes = (self.lattice.descriptor.q * self.memory.storage.dtype(0).nbytes + numpy.int32(0).nbytes) * self.memory.volume
+
+    def build(self):
+        program_src = Template(filename = str(Path(__file__).parent/'../template/reduction.mako')).render(
+            descriptor = self.lattice.descriptor,
+            geometry   = self.lattice.geometry,
+            memory     = self.memory,
+
+            moments_subexpr    = self.lattice.moments[0],
+            moments_assignment = self.lattice.moments[1],
+
+            float_type = self.lattice.float_type[1],
+            shifted    = self.lattice.shifted,
+            group_size = self.group_size,
+            groups     = self.groups,
+
+            ccode = sympy.ccode
+        )
+        return self.lattice.program_cache.build(self.lattice.context, program_src, self.lattice.compiler_args)
+
+class Reductions(Reduction):
+    def __init__(self, lattice, group_size = 256, depth = 64):
+        super().__init__(lattice, group_size)
+
+        float_size = self.lattice.float_type[0](0).nbytes
+        self.cl_partial       = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=3 * self.groups * float_size)
+        self.cl_partial_cells = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=2 * self.groups * numpy.uint32(0).nbytes)
+        self.cl_result        = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=3 * float_size)
+        self.cl_result_cells  = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=2 * numpy.uint32(0).nbytes)
+
+        self.reduce_cells = cl.Kernel(self.program, 'reduce_cells')
+        if self.memory.streaming == 'AA':
+            self.reduce_cells_swapped = cl.Kernel(self.program, 'reduce_cells_swapped')
+        self.reduce_partials = cl.Kernel(self.program, 'reduce_partials')
+        self.reduce_partials.set_args(self.cl_partial, self.cl_partial_cells, self.cl_result, self.cl_result_cells)
+
+        self.pending = deque()
+        self.history = deque(maxlen = depth)
+
+    def enqueue(self, lattice = None):
+        if self.lattice.swapped():
+            kernel = self.reduce_cells_swapped
+        else:
+            kernel = self.reduce_cells
+        kernel.set_args(self.lattice.population(), self.memory.cl_material, self.cl_partial, self.cl_partial_cells)
+
+        self.lattice.stats.record('reduce_cells', cl.enqueue_nd_range_kernel(
+            self.lattice.queue, kernel, (self.groups * self.group_size,), (self.group_size,)), self.reduce_bytes)
+        self.lattice.stats.record('reduce_partials', cl.enqueue_nd_range_kernel(
+            self.lattice.queue, self.reduce_partials, (self.group_size,), (self.group_size,)))
+
+        result = numpy.empty(3, dtype=self.lattice.float_type[0])
+        cells  = numpy.empty(2, dtype=numpy.uint32)
+        cl.enqueue_copy(self.lattice.queue, result, self.cl_result, is_blocking = False)
+        copied = cl.enqueue_copy(self.lattice.queue, cells, self.cl_result_cells, is_blocking = False)
+        self.pending.append((self.lattice.time, result, cells, copied))
+
+        return copied
+
+    def collect(self):
+        while len(self.pending) > 0:
+            time, result, cells, copied = self.pending.popleft()
+            copied.wait()
+            self.history.append({
+                'time':           time,
+                'mass':           float(result[0]),
+                'kinetic_energy': float(result[1]),
+                'max_velocity':   float(result[2]),
+                'cells':          int(cells[0]),
+                'fluid_cells':    int(cells[1])
+            })
+        return list(self.history)
+
+    def latest(self):
+        self.collect()
+        return self.history[-1] if len(self.history) > 0 else None
+
+    def compute(self):
+        self.enqueue()
+        return self.latest()
+
+class Residual(Reduction):
+    def __init__(self, lattice, group_size = 256, depth = 16):
+        super().__init__(lattice, group_size)
+
+        self.depth = depth
+
+        float_size = self.lattice.float_type[0](0).nbytes
+        self.cl_u_prev  = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=self.lattice.descriptor.d * self.memory.volume * float_size)
+        self.cl_partial = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=4 * self.groups * float_size)
+        self.cl_history = cl.Buffer(self.lattice.context, mf.READ_WRITE, size=2 * self.depth * float_size)
+
+        self.residual_cells = cl.Kernel(self.program, 'residual_cells')
+        if self.memory.streaming == 'AA':
+            self.residual_cells_swapped = cl.Kernel(self.program, 'residual_cells_swapped')
+        self.reduce_residual = cl.Kernel(self.program, 'reduce_residual')
+
+        self.residual_bytes = self.reduce_bytes + 2 * self.lattice.descriptor.d * float_size * self.memory.volume
+
+        self.reset()
+
+    def reset(self):
+        cl.enqueue_fill_buffer(self.lattice.queue, self.cl_u_prev,  numpy.uint8(0), 0, self.cl_u_prev.size)
+        cl.enqueue_fill_buffer(self.lattice.queue, self.cl_history, numpy.uint8(0), 0, self.cl_history.size)
+        self.checks  = 0
+        self.times   = deque(maxlen = self.depth)
+        self.pending = deque()
+        self.last    = None
+
+    def enqueue(self, lattice = None):
+        slot = self.checks % self.depth
+
+        if self.lattice.swapped():
+            kernel = self.residual_cells_swapped
+        else:
+            kernel = self.residual_cells
+        kernel.set_args(self.lattice.population(), self.memory.cl_material, self.cl_u_prev, self.cl_partial)
+        self.reduce_residual.set_args(self.cl_partial, self.cl_history, numpy.uint32(slot))
+
+        self.lattice.stats.record('residual_cells', cl.enqueue_nd_range_kernel(
+            self.lattice.queue, kernel, (self.groups * self.group_size,), (self.group_size,)), self.residual_bytes)
+        self.lattice.stats.record('reduce_residual', cl.enqueue_nd_range_kernel(
+            self.lattice.queue, self.reduce_residual, (self.group_size,), (self.group_size,)))
+
+        # only the two scalars of the current slot cross the bus
+        result = numpy.empty(2, dtype=self.lattice.float_type[0])
+        copied = cl.enqueue_copy(self.lattice.queue, result, self.cl_history,
+                                 device_offset = 2 * slot * result.itemsize, is_blocking = False)
+        self.pending.append((self.lattice.time, result, copied))
+        self.times.append(self.lattice.time)
+        self.checks += 1
+
+        return copied
+
+    def collect(self, keep = 0):
+        while len(self.pending) > keep:
+            time, result, copied = self.pending.popleft()
+            copied.wait()
+            self.last = {
+                'time': time,
+                'L2':   float(result[0]),
+                'Linf': float(result[1])
+            }
+        return self.last
+
+    def converged(self, tol, norm = 'L2', keep = 0):
+        # the first check compares against a resting fluid and always yields 1
+        last = self.collect(keep)
+        return last != None and last[norm] < tol
+
+    def history(self):
+        ring = numpy.empty((self.depth, 2), dtype=self.lattice.float_type[0])
+        cl.enqueue_copy(self.lattice.queue, ring, self.cl_history).wait()
+
+        n = min(self.checks, self.depth)
+        return [
+            {
+                'time': time,
+                'L2':   float(ring[slot % self.depth][0]),
+                'Linf': float(ring[slot % self.depth][1])
+            } for time, slot in zip(self.times, range(self.checks - n, self.checks))
+        ]
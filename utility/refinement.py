@@ -0,0 +1,212 @@
+import pyopencl as cl
+mf = cl.mem_flags
+
+import numpy
+import sympy
+
+from mako.template import Template
+from pathlib import Path
+
+from simulation import Lattice, Geometry
+
+import symbolic.optimizations as optimizations
+
+def refined_relaxation_time(tau):
+    # halving the cell size at constant lattice velocity doubles the lattice viscosity
+    return 2*(tau - 0.5) + 0.5
+
+class Refinement:
+    def __init__(self, parent, origin, extent, lbm, collide, tau, boundary_src = None, level = 1, offset = None, **lattice_args):
+        if parent.memory.streaming != 'AB' or parent.block != None:
+            raise ValueError('grid refinement requires a dense lattice with AB streaming')
+
+        d = parent.descriptor.d
+        if len(origin) != d or len(extent) != d:
+            raise ValueError('refinement origin and extent must match the lattice dimension')
+        for o, n, size in zip(origin, extent, parent.geometry.size()):
+            if o < 2 or o + n + 2 > size or n < 4:
+                raise ValueError('refinement must lie at least two cells inside of its parent')
+
+        self.parent = parent
+        self.origin = tuple(origin)
+        self.extent = tuple(extent)
+        self.level  = level
+        self.offset = tuple(offset) if offset != None else tuple(2*o for o in origin)
+
+        self.parent_tau = tau
+        self.child_tau  = refined_relaxation_time(tau)
+
+        self.lattice = Lattice(
+            descriptor = parent.descriptor,
+            geometry   = Geometry(*[ 2*n for n in extent ]),
+            moments    = parent.moments,
+            collide    = collide(self.child_tau),
+            boundary_src  = boundary_src if boundary_src != None else parent.boundary_src,
+            precision     = parent.precision,
+            shifted       = parent.shifted,
+            program_cache = parent.program_cache,
+            queue         = parent.queue,
+            **lattice_args)
+
+        self.halo_size = tuple(n + 2 for n in extent)
+
+        self.build_kernel(lbm)
+
+        pop_bytes   = parent.descriptor.q * parent.memory.storage.dtype(0).nbytes
+        state_bytes = (d + 1 + parent.descriptor.q) * self.lattice.float_type[0](0).nbytes
+
+        self.cl_state_prev = cl.Buffer(parent.context, mf.READ_WRITE, size=state_bytes * int(numpy.prod(self.halo_size)))
+        self.cl_state_next = cl.Buffer(parent.context, mf.READ_WRITE, size=state_bytes * int(numpy.prod(self.halo_size)))
+
+        interface_cells = self.lattice.geometry.volume - int(numpy.prod([ 2*n - 4 for n in extent ]))
+        covered_cells   = int(numpy.prod([ n - 2 for n in extent ]))
+
+        self.collect_bytes     = (pop_bytes + state_bytes) * int(numpy.prod(self.halo_size))
+        self.prolongate_bytes  = (2 * state_bytes + pop_bytes) * interface_cells
+        self.restrict_bytes    = (2**d + 1) * pop_bytes * covered_cells
+
+        self.cover_parent()
+
+        material = self.lattice.material.reshape(self.lattice.memory.size(), order='F')
+        material[...] = 0
+        material[tuple(slice(2, 2*n - 2) for n in extent)] = 1
+        self.lattice.sync_material()
+
+        self.collect(self.cl_state_prev)
+
+    def build_kernel(self, lbm):
+        equilibrium = sympy.cse(lbm.equilibrium(), optimizations=optimizations.custom, symbols=sympy.numbered_symbols(prefix='e'))
+
+        program_src = Template(filename = str(Path(__file__).parent/'../template/refinement.mako')).render(
+            descriptor = self.parent.descriptor,
+            parent     = self.parent.memory,
+            child      = self.lattice.memory,
+            origin     = self.origin,
+            extent     = self.extent,
+
+            moments_subexpr        = self.parent.moments[0],
+            moments_assignment     = self.parent.moments[1],
+            equilibrium_subexpr    = equilibrium[0],
+            equilibrium_assignment = equilibrium[1],
+            parent_collide = self.parent.collide,
+            child_collide  = self.lattice.collide,
+
+            # non-equilibrium populations scale with the relaxation time per time step
+            scale_down = self.child_tau / (2*self.parent_tau),
+            scale_up   = 2*self.parent_tau / self.child_tau,
+
+            float_type = self.lattice.float_type[1],
+
+            ccode = sympy.ccode
+        )
+        self.program = self.parent.program_cache.build(self.parent.context, program_src, self.parent.compiler_args)
+
+        self.collect_parent = cl.Kernel(self.program, 'collect_parent')
+        self.prolongate     = cl.Kernel(self.program, 'prolongate')
+        self.restrict_child = cl.Kernel(self.program, 'restrict_child')
+
+    def cover_parent(self):
+        # parent cells inside of the child are restricted instead of updated
+        material = self.parent.material.reshape(self.parent.memory.size(), order='F')
+        material[tuple(slice(o + 1, o + n - 1) for o, n in zip(self.origin, self.extent))] = 0
+        self.parent.sync_material()
+
+    def setup_sdf_obstacle(self, sdf_src, domain, domain_scale = 1):
+        sdf_kernel_src = Template(
+            filename = 'template/sdf_refinement.cl.mako',
+            lookup   = self.lattice.mako_lookup
+        ).render(
+            geometry = self.lattice.geometry,
+            memory   = self.lattice.memory,
+            domain   = domain.memory,
+            domain_scale = domain_scale,
+            scale    = domain_scale / 2**self.level,
+            offset   = self.offset,
+            sdf_src  = sdf_src
+        )
+
+        sdf_program = self.lattice.program_cache.build(self.lattice.context, sdf_kernel_src, self.lattice.compiler_args)
+        sdf_program.setup_refinement_with_sdf_obstacle(self.lattice.queue, self.lattice.memory.size(), None, self.lattice.memory.cl_material)
+        cl.enqueue_copy(self.lattice.queue, self.lattice.material, self.lattice.memory.cl_material).wait()
+
+    def previous_population(self, lattice):
+        if lattice.tick:
+            return lattice.memory.cl_pop_a
+        else:
+            return lattice.memory.cl_pop_b
+
+    def collect(self, state):
+        # the buffer read by the latest update yields the pre-collision state of the parent
+        self.collect_parent.set_args(self.previous_population(self.parent), state)
+        self.parent.stats.record('collect_parent', cl.enqueue_nd_range_kernel(
+            self.parent.queue, self.collect_parent, self.halo_size, None), self.collect_bytes)
+
+    def interpolate(self, alpha):
+        self.prolongate.set_args(self.cl_state_prev, self.cl_state_next, self.lattice.population(), self.lattice.float_type[0](alpha))
+        self.parent.stats.record('prolongate', cl.enqueue_nd_range_kernel(
+            self.parent.queue, self.prolongate, self.lattice.geometry.size(), None), self.prolongate_bytes)
+
+    def restrict(self):
+        self.restrict_child.set_args(self.previous_population(self.lattice), self.parent.population())
+        self.parent.stats.record('restrict_child', cl.enqueue_nd_range_kernel(
+            self.parent.queue, self.restrict_child, tuple(n - 2 for n in self.extent), None), self.restrict_bytes)
+
+    def advance(self, evolve):
+        self.collect(self.cl_state_next)
+        for alpha in (0.0, 0.5):
+            self.interpolate(alpha)
+            evolve(self.lattice)
+        self.restrict()
+        self.cl_state_prev, self.cl_state_next = self.cl_state_next, self.cl_state_prev
+
+    def refine(self, origin, extent, lbm, collide, boundary_src = None, **lattice_args):
+        return Refinement(self.lattice, origin, extent, lbm, collide, self.child_tau, boundary_src,
+            level  = self.level + 1,
+            offset = tuple(2*(p + o) for p, o in zip(self.offset, origin)),
+            **lattice_args)
+
+class RefinedLattice:
+    def __init__(self, lattice, tau):
+        self.lattice = lattice
+        self.tau     = tau
+        self.refinements = [ ]
+
+    def refine(self, origin, extent, lbm, collide, parent = None, boundary_src = None, **lattice_args):
+        if parent == None:
+            refinement = Refinement(self.lattice, origin, extent, lbm, collide, self.tau, boundary_src, **lattice_args)
+        else:
+            refinement = parent.refine(origin, extent, lbm, collide, boundary_src, **lattice_args)
+        self.refinements.append(refinement)
+        return refinement
+
+    def children(self, lattice):
+        return [ refinement for refinement in self.refinements if refinement.parent is lattice ]
+
+    def step(self, lattice):
+        lattice.evolve()
+        for refinement in self.children(lattice):
+            refinement.advance(self.step)
+
+    def evolve(self, n = 1):
+        for i in range(n):
+            self.step(self.lattice)
+
+    def setup_channel_with_sdf_obstacle(self, sdf_src, scale = 1):
+        self.lattice.setup_channel_with_sdf_obstacle(sdf_src, scale)
+        for refinement in self.refinements:
+            refinement.setup_sdf_obstacle(sdf_src, self.lattice, scale)
+        for refinement in self.refinements:
+            refinement.cover_parent()
+
+    def sync(self):
+        self.lattice.sync()
+
+    @property
+    def time(self):
+        return self.lattice.time
+
+    def cells(self):
+        return self.lattice.geometry.volume + sum([ refinement.lattice.geometry.volume for refinement in self.refinements ])
+
+    def updates_per_step(self):
+        return self.lattice.geometry.volume + sum([ 2**refinement.level * refinement.lattice.geometry.volume for refinement in self.refinements ])
@@ -48,7 +48,7 @@ class Streamlines:
             memory     = self.lattice.memory,
             float_type = self.float_type,
         )
-        self.program = cl.Program(self.lattice.context, program_src).build(self.lattice.compiler_args)
+        self.program = self.lattice.program_cache.build(self.lattice.context, program_src, self.lattice.compiler_args)
 
     def bind(self, location = GL_TEXTURE0):
         glEnable(self.gl_texture_type)
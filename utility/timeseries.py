@@ -0,0 +1,106 @@
+import numpy
+
+import json
+import os
+import queue
+import threading
+
+from pathlib import Path
+
+class MomentsWriter:
+    def __init__(self, path, shape, dtype, depth = 4):
+        self.path = Path(path)
+        self.path.mkdir(parents = True, exist_ok = True)
+
+        self.header = {
+            'shape': list(shape),
+            'dtype': numpy.dtype(dtype).str,
+            'times': []
+        }
+
+        self.data = open(self.path/'moments.raw', 'wb')
+        self.write_header()
+
+        self.queue  = queue.Queue(maxsize = depth)
+        self.error  = None
+        self.thread = threading.Thread(target = self.work, daemon = True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_header(self):
+        tmp = self.path/'header.json.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.header, f)
+        os.replace(tmp, self.path/'header.json')
+
+    def work(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+
+                time, moments = item
+                self.data.write(numpy.ascontiguousarray(moments, dtype = self.header['dtype']).tobytes())
+                self.data.flush()
+
+                self.header['times'].append(time)
+                self.write_header()
+        except Exception as e:
+            self.error = e
+
+    def check(self):
+        if self.error != None:
+            raise self.error
+
+    def put(self, item):
+        # a failed writer no longer drains the queue so waiting on it must not block forever
+        while True:
+            self.check()
+            try:
+                self.queue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                pass
+
+    def append(self, time, moments):
+        self.put((time, moments.copy()))
+
+    def close(self):
+        try:
+            self.put(None)
+            self.thread.join()
+        finally:
+            self.data.close()
+        self.check()
+
+class MomentsReader:
+    def __init__(self, path):
+        self.path = Path(path)
+
+        with open(self.path/'header.json') as f:
+            header = json.load(f)
+
+        self.shape = tuple(header['shape'])
+        self.dtype = numpy.dtype(header['dtype'])
+        self.times = header['times']
+
+        if len(self.times) > 0:
+            self.data = numpy.memmap(self.path/'moments.raw', dtype = self.dtype, mode = 'r', shape = (len(self.times),) + self.shape)
+        else:
+            self.data = numpy.ndarray(shape = (0,) + self.shape, dtype = self.dtype)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]